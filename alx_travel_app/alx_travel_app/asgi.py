@@ -0,0 +1,15 @@
+"""
+ASGI config for alx_travel_app project.
+
+Serves the same application as WSGI, plus long-lived async views such as the
+payment status stream without tying up a worker thread per connection.
+Run with e.g. ``uvicorn alx_travel_app.asgi:application``.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+
+application = get_asgi_application()
@@ -1,11 +1,23 @@
 from django.contrib import admin
-from .models import Listing, Booking, Payment
+from .models import (
+    Listing, SeasonalRate, LengthOfStayDiscount, Booking, Payment, PaymentEvent, ListingStats,
+    BookingArchive, PaymentArchive, PaymentEventArchive
+)
+
+class SeasonalRateInline(admin.TabularInline):
+    model = SeasonalRate
+    extra = 0
+
+class LengthOfStayDiscountInline(admin.TabularInline):
+    model = LengthOfStayDiscount
+    extra = 0
 
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
     list_display = ('title', 'price_per_night', 'location', 'bedrooms', 'bathrooms', 'is_available')
     list_filter = ('is_available', 'location')
     search_fields = ('title', 'description', 'location')
+    inlines = [SeasonalRateInline, LengthOfStayDiscountInline]
     list_per_page = 20
 
 @admin.register(Booking)
@@ -16,10 +28,74 @@ class BookingAdmin(admin.ModelAdmin):
     readonly_fields = ('reference',)
     list_per_page = 20
 
+class PaymentEventInline(admin.TabularInline):
+    model = PaymentEvent
+    fields = ('source', 'created_at', 'data')
+    readonly_fields = ('source', 'created_at', 'data')
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('transaction_id', 'booking', 'amount', 'status', 'payment_date', 'created_at')
     list_filter = ('status', 'payment_date', 'created_at')
-    search_fields = ('transaction_id', 'chapa_transaction_id', 'booking__reference')
-    readonly_fields = ('transaction_id', 'chapa_transaction_id', 'raw_response')
-    list_per_page = 20
\ No newline at end of file
+    # Exact lookups so each identifier is a unique-index probe
+    search_fields = (
+        'transaction_id__exact',
+        'tx_ref__exact',
+        'chapa_transaction_id__exact',
+        'booking__reference__exact',
+    )
+    readonly_fields = ('transaction_id', 'chapa_transaction_id', 'checkout_url')
+    inlines = [PaymentEventInline]
+    list_per_page = 20
+
+@admin.register(ListingStats)
+class ListingStatsAdmin(admin.ModelAdmin):
+    list_display = ('listing', 'bookings_count', 'confirmed_count', 'booked_nights', 'revenue', 'updated_at')
+    list_select_related = ('listing',)
+    ordering = ('-confirmed_count',)
+    readonly_fields = ('listing', 'bookings_count', 'confirmed_count', 'booked_nights', 'revenue', 'updated_at')
+    list_per_page = 20
+
+class ReadOnlyArchiveAdmin(admin.ModelAdmin):
+    """Archived rows are kept as they were when moved"""
+    list_per_page = 20
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(BookingArchive)
+class BookingArchiveAdmin(ReadOnlyArchiveAdmin):
+    list_display = ('id', 'reference', 'user', 'listing', 'check_in', 'check_out', 'status', 'total_price', 'archived_at')
+    list_select_related = ('user', 'listing')
+    list_filter = ('status', 'check_in')
+    search_fields = ('reference__exact', 'user__username')
+
+class PaymentEventArchiveInline(admin.TabularInline):
+    model = PaymentEventArchive
+    fields = ('source', 'created_at', 'data')
+    readonly_fields = ('source', 'created_at', 'data')
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(PaymentArchive)
+class PaymentArchiveAdmin(ReadOnlyArchiveAdmin):
+    list_display = ('transaction_id', 'booking', 'amount', 'status', 'payment_date', 'archived_at')
+    list_filter = ('status', 'payment_date')
+    search_fields = (
+        'transaction_id__exact',
+        'tx_ref__exact',
+        'chapa_transaction_id__exact',
+        'booking__reference__exact',
+    )
+    inlines = [PaymentEventArchiveInline]
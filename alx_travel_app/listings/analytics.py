@@ -0,0 +1,155 @@
+"""Vectorized occupancy and demand analytics over booking history.
+
+Bookings, live and archived, are streamed from the database in chunks and folded into
+fixed-size arrays (locations x days), so memory depends on the window and the
+number of locations, not on the number of bookings:
+
+* occupancy uses a difference array per location, turned into nightly
+  booked counts with one cumulative sum;
+* lead times (check-in minus booking date) go into a day histogram;
+* revenue and nights are summed per location for the average daily rate.
+"""
+from datetime import timedelta
+
+import numpy as np
+
+from .models import Listing, Booking, BookingArchive
+
+ACTIVE_STATUSES = (Booking.CONFIRMED, Booking.COMPLETED)
+MAX_LEAD_DAYS = 365
+
+class OccupancyAnalytics:
+    """Accumulates booking history for [start, end) and derives metrics"""
+
+    def __init__(self, start, end, chunk_size=100_000):
+        self.start = start
+        self.end = end
+        self.days = (end - start).days
+        self.chunk_size = chunk_size
+
+        listings = list(Listing.objects.values_list('id', 'location'))
+        self.locations = sorted({location for _, location in listings})
+        location_index = {location: index for index, location in enumerate(self.locations)}
+        max_id = max((listing_id for listing_id, _ in listings), default=0)
+        # Listing id -> location index lookup table
+        self.listing_location = np.full(max_id + 1, -1, dtype=np.int32)
+        for listing_id, location in listings:
+            self.listing_location[listing_id] = location_index[location]
+        self.listing_counts = np.bincount(
+            self.listing_location[self.listing_location >= 0], minlength=len(self.locations)
+        )
+
+        n = len(self.locations)
+        self.occupancy_diff = np.zeros((n, self.days + 1), dtype=np.int64)
+        self.lead_counts = np.zeros(MAX_LEAD_DAYS + 1, dtype=np.int64)
+        self.booking_counts = np.zeros(n, dtype=np.int64)
+        self.nights = np.zeros(n, dtype=np.int64)
+        self.revenue = np.zeros(n, dtype=np.float64)
+
+    def load(self):
+        """Stream bookings overlapping the window and fold them in, chunk by chunk"""
+        origin = self.start.toordinal()
+        chunk = []
+        for model in (Booking, BookingArchive):
+            rows = model.objects.filter(
+                status__in=ACTIVE_STATUSES,
+                check_in__lt=self.end,
+                check_out__gt=self.start
+            ).values_list('listing_id', 'check_in', 'check_out', 'total_price', 'created_at')
+            for listing_id, check_in, check_out, total_price, created_at in rows.iterator(chunk_size=self.chunk_size):
+                chunk.append((
+                    listing_id,
+                    check_in.toordinal() - origin,
+                    check_out.toordinal() - origin,
+                    float(total_price),
+                    check_in.toordinal() - created_at.date().toordinal(),
+                ))
+                if len(chunk) >= self.chunk_size:
+                    self._fold(np.array(chunk))
+                    chunk = []
+        if chunk:
+            self._fold(np.array(chunk))
+        return self
+
+    def _fold(self, chunk):
+        listing_ids = chunk[:, 0].astype(np.int64)
+        first = chunk[:, 1].astype(np.int64)
+        last = chunk[:, 2].astype(np.int64)
+        price = chunk[:, 3]
+        lead = chunk[:, 4].astype(np.int64)
+
+        known = listing_ids < len(self.listing_location)
+        location = np.where(known, self.listing_location[np.minimum(listing_ids, len(self.listing_location) - 1)], -1)
+        keep = location >= 0
+        location, first, last, price, lead = location[keep], first[keep], last[keep], price[keep], lead[keep]
+        n = len(self.locations)
+
+        # Nights inside the window only
+        clipped_first = np.clip(first, 0, self.days)
+        clipped_last = np.clip(last, 0, self.days)
+        np.add.at(self.occupancy_diff, (location, clipped_first), 1)
+        np.add.at(self.occupancy_diff, (location, clipped_last), -1)
+
+        nights = last - first
+        self.booking_counts += np.bincount(location, minlength=n)
+        self.nights += np.bincount(location, weights=nights, minlength=n).astype(np.int64)
+        self.revenue += np.bincount(location, weights=price, minlength=n)
+        self.lead_counts += np.bincount(np.clip(lead, 0, MAX_LEAD_DAYS), minlength=MAX_LEAD_DAYS + 1)
+
+    def occupancy(self):
+        """Booked share of listings per location and night (locations x days)"""
+        booked = np.cumsum(self.occupancy_diff, axis=1)[:, :self.days]
+        return booked / np.maximum(self.listing_counts, 1)[:, None]
+
+    def lead_time_percentiles(self, percentiles=(50, 75, 90, 99)):
+        total = self.lead_counts.sum()
+        if not total:
+            return {p: None for p in percentiles}
+        cumulative = np.cumsum(self.lead_counts) / total
+        return {p: int(np.searchsorted(cumulative, p / 100)) for p in percentiles}
+
+    def forecast(self, horizon=28):
+        """Seasonal-naive demand forecast of booked listings per night.
+
+        Repeats the mean of each weekday over the last four weeks, scaled by
+        the trend between the last 28 days and the 28 before them.
+        """
+        booked = np.cumsum(self.occupancy_diff, axis=1)[:, :self.days].astype(np.float64)
+        n = len(self.locations)
+        if self.days < 28:
+            return np.zeros((n, horizon))
+        recent = booked[:, -28:]
+        weekday_means = recent.reshape(n, 4, 7).mean(axis=1)
+        if self.days >= 56:
+            previous = booked[:, -56:-28].sum(axis=1)
+            trend = np.clip(recent.sum(axis=1) / np.maximum(previous, 1), 0.5, 2.0)
+        else:
+            trend = np.ones(n)
+        # Day i of the forecast falls on the same weekday as day i of ``recent``
+        pattern = np.tile(weekday_means, (1, horizon // 7 + 1))[:, :horizon]
+        return pattern * trend[:, None]
+
+    def summary(self, horizon=28):
+        occupancy = self.occupancy()
+        forecast = self.forecast(horizon)
+        locations = []
+        for index, location in enumerate(self.locations):
+            nights = int(self.nights[index])
+            locations.append({
+                'location': location,
+                'listings': int(self.listing_counts[index]),
+                'bookings': int(self.booking_counts[index]),
+                'booked_nights': nights,
+                'occupancy_rate': round(float(occupancy[index].mean()), 4) if self.days else 0.0,
+                'adr': round(float(self.revenue[index] / nights), 2) if nights else None,
+                'occupancy_curve': np.round(occupancy[index], 4).tolist(),
+                'forecast': np.round(forecast[index], 2).tolist(),
+            })
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'forecast_start': self.end.isoformat(),
+            'forecast_end': (self.end + timedelta(days=horizon)).isoformat(),
+            'lead_time_percentiles': self.lead_time_percentiles(),
+            'locations': locations,
+        }
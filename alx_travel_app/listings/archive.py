@@ -0,0 +1,90 @@
+"""Move finished bookings and their payments into archive tables.
+
+Almost all traffic touches recent or upcoming stays, so completed and
+cancelled bookings whose stay ended more than ARCHIVE_AFTER_DAYS ago are
+moved, with their payment and payment events, into the ``*Archive`` tables
+in short batches. Confirmed stays become completed once they end
+(``transitions.complete_past_stays``). Each batch is copied and deleted in
+one transaction, and rows keep their ids and references, so the API and
+admin can read them from the archive afterwards.
+
+Archived rows still count towards ListingStats, so the per-booking delete
+handlers are muted during a move, and each touched listing's calendar is
+invalidated once per batch.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import invalidate_calendar
+from .models import (
+    Booking, Payment, PaymentEvent,
+    BookingArchive, PaymentArchive, PaymentEventArchive
+)
+from .signals import booking_signals_muted
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = (Booking.COMPLETED, Booking.CANCELLED)
+
+def _columns(archive_model):
+    """Live-table columns copied into ``archive_model``"""
+    return [f.attname for f in archive_model._meta.concrete_fields if f.name != 'archived_at']
+
+def archive_cutoff(older_than_days):
+    """Stays that ended before this date may be archived"""
+    return timezone.now().date() - timedelta(days=older_than_days)
+
+def archivable(cutoff):
+    """Bookings that may be archived: finished, with the stay over before ``cutoff``"""
+    return Booking.objects.filter(status__in=ARCHIVABLE_STATUSES, check_out__lt=cutoff)
+
+def archive_batch(booking_ids, cutoff):
+    """Move the given bookings, if still archivable, with their payments; returns the count moved"""
+    with transaction.atomic():
+        ids = list(
+            archivable(cutoff).filter(id__in=booking_ids)
+            .select_for_update(skip_locked=True).values_list('id', flat=True)
+        )
+        if not ids:
+            return 0
+        now = timezone.now()
+        
+        bookings = list(Booking.objects.filter(id__in=ids).values(*_columns(BookingArchive)))
+        BookingArchive.objects.bulk_create([BookingArchive(archived_at=now, **row) for row in bookings])
+        PaymentArchive.objects.bulk_create([
+            PaymentArchive(archived_at=now, **row)
+            for row in Payment.objects.filter(booking_id__in=ids).values(*_columns(PaymentArchive))
+        ])
+        events = PaymentEvent.objects.filter(payment__booking_id__in=ids)
+        PaymentEventArchive.objects.bulk_create([
+            PaymentEventArchive(**row) for row in events.values(*_columns(PaymentEventArchive))
+        ])
+        
+        # Children first, so the booking delete has nothing left to cascade
+        events.delete()
+        Payment.objects.filter(booking_id__in=ids).delete()
+        with booking_signals_muted():
+            Booking.objects.filter(id__in=ids).delete()
+        
+        listing_ids = {row['listing_id'] for row in bookings}
+        transaction.on_commit(lambda: [invalidate_calendar(listing_id) for listing_id in listing_ids])
+    return len(ids)
+
+def archive_records(older_than_days, batch_size=1000, limit=None):
+    """Archive finished bookings in batches; returns the number archived"""
+    cutoff = archive_cutoff(older_than_days)
+    candidates = archivable(cutoff).order_by('id')
+    archived = 0
+    last_id = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        archived += archive_batch(ids, cutoff)
+    logger.info(f"Archived {archived} bookings that ended before {cutoff}")
+    return archived
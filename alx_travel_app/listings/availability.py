@@ -0,0 +1,84 @@
+"""Per-listing availability calendars encoded as compact day bitmaps.
+
+Bit ``i`` of the bitmap is set when the night starting ``start + i days`` is
+taken. Calendars are cached per listing under a version number that booking
+changes bump, so a change invalidates every cached window at once.
+"""
+import base64
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .metrics import record_cache
+from .models import Booking
+
+def _version_key(listing_id):
+    return f"calendar-version:{listing_id}"
+
+def invalidate_calendar(listing_id):
+    """Drop all cached calendars for a listing"""
+    try:
+        cache.incr(_version_key(listing_id))
+    except ValueError:
+        # Nothing cached yet for this listing
+        pass
+
+def booked_bitmap(listing_id, start, days):
+    """Build the bitmap for ``days`` nights from ``start`` with one range query"""
+    end = start + timedelta(days=days)
+    hold_cutoff = timezone.now() - timedelta(seconds=settings.BOOKING_HOLD_TTL)
+    stays = Booking.objects.filter(
+        listing_id=listing_id,
+        check_in__lt=end,
+        check_out__gt=start
+    ).filter(
+        Q(status__in=[Booking.CONFIRMED, Booking.COMPLETED]) | Q(status=Booking.PENDING, created_at__gte=hold_cutoff)
+    ).values_list('check_in', 'check_out')
+    
+    bitmap = bytearray((days + 7) // 8)
+    for check_in, check_out in stays:
+        first = max((check_in - start).days, 0)
+        last = min((check_out - start).days, days)
+        for day in range(first, last):
+            bitmap[day >> 3] |= 1 << (day & 7)
+    return bytes(bitmap)
+
+def run_lengths(bitmap, days):
+    """Booked runs as ``[offset, length]`` pairs"""
+    runs = []
+    run_start = None
+    for day in range(days):
+        booked = bitmap[day >> 3] >> (day & 7) & 1
+        if booked and run_start is None:
+            run_start = day
+        elif not booked and run_start is not None:
+            runs.append([run_start, day - run_start])
+            run_start = None
+    if run_start is not None:
+        runs.append([run_start, days - run_start])
+    return runs
+
+def listing_calendar(listing_id, start, days, encoding='bitset'):
+    """Return the encoded calendar, from cache when possible"""
+    version = cache.get_or_set(_version_key(listing_id), 1, None)
+    key = f"calendar:{listing_id}:{version}:{start.isoformat()}:{days}:{encoding}"
+    calendar = cache.get(key)
+    record_cache(calendar is not None)
+    if calendar is not None:
+        return calendar
+    
+    bitmap = booked_bitmap(listing_id, start, days)
+    calendar = {
+        'listing': listing_id,
+        'start': start.isoformat(),
+        'days': days,
+        'encoding': encoding,
+        'booked': run_lengths(bitmap, days) if encoding == 'rle' else base64.b64encode(bitmap).decode(),
+    }
+    # Pending bookings drop out when their hold lapses without a write, so
+    # cached calendars also expire on their own
+    cache.set(key, calendar, settings.CALENDAR_CACHE_TTL)
+    return calendar
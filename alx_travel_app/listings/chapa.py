@@ -0,0 +1,112 @@
+"""Chapa API client.
+
+Both variants keep connections to Chapa open between calls: the sync one
+through a shared ``requests.Session``, the async one through an
+``httpx.AsyncClient`` per event loop, so a burst of payment calls reuses TLS
+connections instead of opening one per request. Every call is timed as the
+``chapa`` external service.
+"""
+import asyncio
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import timed_external
+
+_session = None
+_async_clients = {}
+
+class ChapaError(Exception):
+    """Chapa could not be reached or returned a non-JSON response"""
+
+def _headers():
+    return {
+        'Authorization': f'Bearer {settings.CHAPA_SECRET_KEY}',
+        'Content-Type': 'application/json'
+    }
+
+def _initialize_url():
+    return f"{settings.CHAPA_BASE_URL}/transaction/initialize"
+
+def _verify_url(reference):
+    return f"{settings.CHAPA_BASE_URL}/transaction/verify/{reference}"
+
+def _refund_url(reference):
+    return f"{settings.CHAPA_BASE_URL}/refund/{reference}"
+
+def get_session():
+    """Return the process-wide pooled session for sync calls"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.CHAPA_MAX_CONNECTIONS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+def get_async_client():
+    """Return the pooled async client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        for stale in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[stale]
+        client = _async_clients[loop] = httpx.AsyncClient(
+            timeout=settings.CHAPA_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.CHAPA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CHAPA_MAX_CONNECTIONS
+            )
+        )
+    return client
+
+def _send(method, url, payload=None):
+    try:
+        with timed_external('chapa'):
+            response = get_session().request(
+                method, url, headers=_headers(), json=payload, timeout=settings.CHAPA_TIMEOUT
+            )
+        return response.status_code, response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ChapaError(str(e)) from e
+
+async def _asend(method, url, payload=None):
+    try:
+        with timed_external('chapa'):
+            response = await get_async_client().request(method, url, headers=_headers(), json=payload)
+        return response.status_code, response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        raise ChapaError(str(e)) from e
+
+def is_paid(status_code, response_data):
+    """Whether a verify response reports the transaction as paid"""
+    return status_code == 200 and response_data.get('status') == 'success'
+
+def initialize(payload):
+    """Start a Chapa checkout; returns ``(status_code, response_data)``"""
+    return _send('POST', _initialize_url(), payload)
+
+def verify(reference):
+    """Look up a transaction by tx_ref; returns ``(status_code, response_data)``"""
+    return _send('GET', _verify_url(reference))
+
+def refund(reference, reason=''):
+    """Refund a paid transaction in full; returns ``(status_code, response_data)``"""
+    return _send('POST', _refund_url(reference), {'reason': reason})
+
+async def ainitialize(payload):
+    """Async variant of :func:`initialize`"""
+    return await _asend('POST', _initialize_url(), payload)
+
+async def averify(reference):
+    """Async variant of :func:`verify`"""
+    return await _asend('GET', _verify_url(reference))
+
+async def aclose():
+    """Close the running loop's client, e.g. before ``asyncio.run`` returns"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,31 @@
+"""Shared connections to external services"""
+import asyncio
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_redis_client = None
+_async_redis_clients = {}
+
+def get_redis():
+    """Return a process-wide Redis client built from settings.REDIS_URL"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+def get_async_redis():
+    """Return an asyncio Redis client for the running event loop.
+
+    Async connections belong to the loop that opened them; an ASGI server runs
+    one loop per process, while async views under WSGI get a fresh loop per
+    request, so clients are kept per loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_redis_clients.get(loop)
+    if client is None:
+        for stale in [l for l in _async_redis_clients if l.is_closed()]:
+            del _async_redis_clients[stale]
+        client = _async_redis_clients[loop] = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+    return client
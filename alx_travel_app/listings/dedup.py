@@ -0,0 +1,35 @@
+"""Collapse duplicate task enqueues within a cooldown window"""
+import logging
+
+import redis
+
+from .connections import get_redis
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+def enqueue_once(task, key, cooldown, *args, **kwargs):
+    """Enqueue ``task`` unless ``key`` was enqueued in the last ``cooldown`` seconds.
+
+    Returns ``(True, 0)`` when the task was sent, or ``(False, retry_after)``
+    when it was dropped before reaching the broker. Dropped enqueues are
+    counted in the ``dedup_suppressed_total`` metric. If Redis is unavailable
+    the task is sent without deduplication: callers enqueue after their own
+    writes have committed, so failing here would report an error for work
+    that already happened.
+    """
+    client = get_redis()
+    dedup_key = f"dedup:{key}"
+    try:
+        claimed = client.set(dedup_key, 1, nx=True, ex=cooldown)
+        retry_after = 0 if claimed else max(client.ttl(dedup_key), 1)
+    except redis.RedisError as e:
+        logger.warning(f"Enqueueing {task.name} for {key} without deduplication: {e}")
+        claimed = True
+    if claimed:
+        task.delay(*args, **kwargs)
+        return True, 0
+    
+    registry.inc('dedup_suppressed_total', {'task': task.name})
+    logger.info(f"Suppressed duplicate {task.name} for {key}, retry in {retry_after}s")
+    return False, retry_after
@@ -0,0 +1,151 @@
+"""Short-lived holds on listing nights during checkout.
+
+A hold reserves every night of a stay for one owner (the booking user) for
+BOOKING_HOLD_TTL seconds. Holds are taken before the database overlap check,
+so concurrent checkouts for the same nights are turned away by Redis instead
+of racing on Booking rows, and they lapse on their own if checkout is
+abandoned. ``acquire`` reports which nights it newly took, so a failed
+checkout releases only those and never the owner's holds for an earlier
+booking.
+
+Holds are an optimisation in front of the database overlap check, not the
+source of truth, so callers carry on without them while Redis is down.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+
+from .connections import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Take every night only if none is held by someone else; returns the
+# positions of the nights that were not already held by the owner
+ACQUIRE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    local holder = redis.call('get', key)
+    if holder and holder ~= ARGV[1] then
+        return false
+    end
+end
+local fresh = {}
+for index, key in ipairs(KEYS) do
+    if not redis.call('get', key) then
+        table.insert(fresh, index)
+    end
+    redis.call('set', key, ARGV[1], 'PX', ARGV[2])
+end
+return fresh
+"""
+
+RELEASE_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        released = released + redis.call('del', key)
+    end
+end
+return released
+"""
+
+def nights(check_in, check_out):
+    """Dates of each night in [check_in, check_out)"""
+    return [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+
+class RedisHoldStore:
+    """Holds stored as one Redis key per listing night"""
+
+    def __init__(self, client=None):
+        self.client = client or get_redis()
+
+    @staticmethod
+    def _keys(listing_id, stay_nights):
+        # The hash tag keeps one listing's nights in the same cluster slot
+        return [f"hold:{{{listing_id}}}:{night.isoformat()}" for night in stay_nights]
+
+    def acquire(self, listing_id, check_in, check_out, owner, ttl):
+        """Hold the stay's nights for ``owner``.
+
+        Returns None if another owner holds any of them, otherwise the list
+        of nights that were not already held by ``owner``.
+        """
+        stay_nights = nights(check_in, check_out)
+        keys = self._keys(listing_id, stay_nights)
+        fresh = self.client.eval(ACQUIRE_SCRIPT, len(keys), *keys, str(owner), int(ttl * 1000))
+        if fresh is None:
+            return None
+        return [stay_nights[index - 1] for index in fresh]
+
+    def release(self, listing_id, check_in, check_out, owner):
+        return self.release_nights(listing_id, nights(check_in, check_out), owner)
+
+    def release_nights(self, listing_id, held_nights, owner):
+        if not held_nights:
+            return 0
+        keys = self._keys(listing_id, held_nights)
+        return self.client.eval(RELEASE_SCRIPT, len(keys), *keys, str(owner))
+
+class InMemoryHoldStore:
+    """Process-local stand-in for RedisHoldStore, for tests and development"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._holds = {}
+
+    def acquire(self, listing_id, check_in, check_out, owner, ttl):
+        owner = str(owner)
+        now = time.monotonic()
+        stay_nights = nights(check_in, check_out)
+        fresh = []
+        with self._lock:
+            for night in stay_nights:
+                holder = self._holds.get((listing_id, night))
+                if holder and holder[1] > now and holder[0] != owner:
+                    return None
+            for night in stay_nights:
+                holder = self._holds.get((listing_id, night))
+                if not (holder and holder[1] > now):
+                    fresh.append(night)
+                self._holds[(listing_id, night)] = (owner, now + ttl)
+        return fresh
+
+    def release(self, listing_id, check_in, check_out, owner):
+        return self.release_nights(listing_id, nights(check_in, check_out), owner)
+
+    def release_nights(self, listing_id, held_nights, owner):
+        owner = str(owner)
+        released = 0
+        with self._lock:
+            for night in held_nights:
+                holder = self._holds.get((listing_id, night))
+                if holder and holder[0] == owner:
+                    del self._holds[(listing_id, night)]
+                    released += 1
+        return released
+
+_store = None
+
+def get_hold_store():
+    """Return the configured hold store (BOOKING_HOLD_BACKEND: redis or memory)"""
+    global _store
+    if _store is None:
+        if settings.BOOKING_HOLD_BACKEND == 'memory':
+            _store = InMemoryHoldStore()
+        else:
+            _store = RedisHoldStore()
+    return _store
+
+def release_booking_holds(booking):
+    """Free the nights held for ``booking``'s owner, logging Redis failures.
+
+    Holds lapse on their own after BOOKING_HOLD_TTL, so a failed release
+    only delays other guests and must not fail the caller.
+    """
+    try:
+        get_hold_store().release(booking.listing_id, booking.check_in, booking.check_out, booking.user_id)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to release holds of booking #{booking.id}: {e}")
@@ -0,0 +1,156 @@
+"""Idempotency-Key support for endpoints that create things.
+
+A client sends the same ``Idempotency-Key`` header on every retry of one
+logical request. The first request claims the key in Redis and runs; its
+response is stored for IDEMPOTENCY_TTL seconds and replayed to retries
+without touching serializers, the database or Chapa. Keys are scoped per
+user and endpoint, and a retry whose payload differs from the original is
+rejected rather than answered with the wrong response. Client errors (4xx),
+including those raised as API exceptions, are stored and replayed like any
+other response; server errors free the key so a retry runs again.
+
+While Redis is down requests run unprotected rather than failing, since
+refusing every booking and payment is worse than a rare duplicate.
+"""
+import hashlib
+import json
+import logging
+import uuid
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .connections import get_redis
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Only the request that claimed the key may store its response or give it up
+COMPLETE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def _dumps(data):
+    return json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+
+def fingerprint(request):
+    """Hash of what makes two requests the same: method, path and payload"""
+    body = _dumps(request.data)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+class IdempotencyClaim:
+    """A claimed key whose response has not been stored yet"""
+
+    def __init__(self, redis_key, marker):
+        self.redis_key = redis_key
+        self.marker = marker
+
+    @classmethod
+    def acquire(cls, request, scope):
+        """Claim the request's Idempotency-Key for ``scope``.
+
+        Returns ``(claim, None)`` when the request should run, with ``claim``
+        None if no key was sent, or ``(None, (body, status, headers))`` to
+        answer with instead: the stored response, or an error for a key that
+        is in flight or was used with a different payload.
+        """
+        key = request.headers.get(HEADER)
+        if not key:
+            return None, None
+        if len(key) > MAX_KEY_LENGTH:
+            return None, ({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                          status.HTTP_400_BAD_REQUEST, {})
+        try:
+            return cls._claim(request, scope, key)
+        except redis.RedisError as e:
+            logger.warning(f"Running {request.path} without {HEADER} protection: {e}")
+            return None, None
+
+    @classmethod
+    def _claim(cls, request, scope, key):
+        client = get_redis()
+        redis_key = f"idempotency:{scope}:{request.user.pk}:{key}"
+        request_fingerprint = fingerprint(request)
+        marker = _dumps({'state': 'running', 'fingerprint': request_fingerprint, 'token': uuid.uuid4().hex})
+        if client.set(redis_key, marker, nx=True, ex=settings.IDEMPOTENCY_LOCK_TTL):
+            return cls(redis_key, marker), None
+        
+        stored = client.get(redis_key)
+        if stored is None:
+            # The previous claim expired between the two calls
+            return cls._claim(request, scope, key)
+        record = json.loads(stored)
+        if record['fingerprint'] != request_fingerprint:
+            return None, ({'error': f'{HEADER} was already used for a different request'},
+                          status.HTTP_422_UNPROCESSABLE_ENTITY, {})
+        if record['state'] == 'running':
+            return None, ({'error': 'A request with this Idempotency-Key is still being processed'},
+                          status.HTTP_409_CONFLICT, {'Retry-After': '1'})
+        return None, (json.loads(record['body']), record['status'], {'Idempotent-Replayed': 'true'})
+
+    def complete(self, status_code, data):
+        """Store the response for replay; server errors free the key instead"""
+        if status_code >= 500:
+            return self.release()
+        record = json.loads(self.marker)
+        record.update(state='done', status=status_code, body=_dumps(data))
+        try:
+            get_redis().eval(COMPLETE_SCRIPT, 1, self.redis_key, self.marker, _dumps(record), settings.IDEMPOTENCY_TTL)
+        except redis.RedisError as e:
+            # Retries get a 409 until IDEMPOTENCY_LOCK_TTL frees the key
+            logger.warning(f"Failed to store the response for {self.redis_key}: {e}")
+
+    def release(self):
+        """Let a retry run the request again"""
+        try:
+            get_redis().eval(RELEASE_SCRIPT, 1, self.redis_key, self.marker)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release {self.redis_key}: {e}")
+
+def idempotent(scope):
+    """Honour Idempotency-Key on a DRF view method taking ``(self, request, ...)``"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            claim, answer = IdempotencyClaim.acquire(request, scope)
+            if answer is not None:
+                body, status_code, headers = answer
+                return Response(body, status=status_code, headers=headers)
+            if claim is None:
+                return view(self, request, *args, **kwargs)
+            
+            try:
+                response = view(self, request, *args, **kwargs)
+            except (APIException, Http404, PermissionDenied) as exc:
+                # Render it as DRF would, so it is stored like a returned 4xx
+                try:
+                    response = self.handle_exception(exc)
+                except BaseException:
+                    claim.release()
+                    raise
+            except BaseException:
+                claim.release()
+                raise
+            claim.complete(response.status_code, response.data)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,153 @@
+"""Local stand-ins for the Chapa API and an SMTP relay, used by load tests.
+
+Point the app at them with:
+    CHAPA_BASE_URL=http://127.0.0.1:8900/v1
+    EMAIL_HOST=127.0.0.1 EMAIL_PORT=8925 EMAIL_USE_TLS=False
+"""
+import json
+import random
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+class FakeChapaHandler(BaseHTTPRequestHandler):
+    """Implements transaction/initialize and transaction/verify/<ref>.
+
+    Like Chapa, a successful initialize is followed by a call to the
+    payload's ``callback_url`` once ``webhook_delay`` seconds have passed.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)) or 0)
+        if not self.path.rstrip('/').endswith('/transaction/initialize'):
+            return self._send(404, {'status': 'failed', 'message': 'Not found'})
+        if self._delay_and_fail():
+            return self._send(400, {'status': 'failed', 'message': 'Injected failure'})
+        payload = json.loads(body or b'{}')
+        reference = payload.get('tx_ref') or uuid.uuid4().hex
+        if payload.get('callback_url') and self.server.webhook_delay is not None:
+            timer = threading.Timer(
+                self.server.webhook_delay,
+                self.server.send_webhook,
+                args=(payload['callback_url'], reference)
+            )
+            timer.daemon = True
+            timer.start()
+        self._send(200, {
+            'status': 'success',
+            'message': 'Hosted Link',
+            'data': {
+                'checkout_url': f"http://{self.headers.get('Host')}/checkout/{reference}",
+                'reference': reference,
+            },
+        })
+
+    def do_GET(self):
+        prefix = '/transaction/verify/'
+        if prefix not in self.path:
+            return self._send(404, {'status': 'failed', 'message': 'Not found'})
+        if self._delay_and_fail():
+            return self._send(400, {'status': 'failed', 'message': 'Injected failure'})
+        reference = self.path.split(prefix, 1)[1].strip('/')
+        self._send(200, {
+            'status': 'success',
+            'message': 'Payment details',
+            'data': {'tx_ref': reference, 'status': 'success', 'payment_method': 'test'},
+        })
+
+    def _delay_and_fail(self):
+        server = self.server
+        if server.latency:
+            time.sleep(random.uniform(server.latency * 0.5, server.latency * 1.5))
+        with server.lock:
+            server.calls += 1
+        return random.random() < server.failure_rate
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeChapaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, failure_rate=0.0, webhook_delay=None):
+        super().__init__(address, FakeChapaHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.webhook_delay = webhook_delay
+        self.calls = 0
+        self.webhook_latencies = []
+        self.webhook_errors = 0
+        self.lock = threading.Lock()
+
+    def send_webhook(self, url, reference):
+        started = time.perf_counter()
+        try:
+            response = requests.post(url, json={'tx_ref': reference, 'status': 'success'}, timeout=30)
+            ok = response.status_code < 400
+        except requests.exceptions.RequestException:
+            ok = False
+        with self.lock:
+            self.webhook_latencies.append(time.perf_counter() - started)
+            if not ok:
+                self.webhook_errors += 1
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Accepts and discards mail, counting delivered messages"""
+
+    def handle(self):
+        self._reply('220 sink ESMTP')
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line.rstrip(b'\r\n') == b'.':
+                    in_data = False
+                    with self.server.lock:
+                        self.server.messages += 1
+                    self._reply('250 OK')
+                continue
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self._reply('250 sink')
+            elif command == b'DATA':
+                in_data = True
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self._reply('250 OK')
+
+    def _reply(self, text):
+        self.wfile.write(f'{text}\r\n'.encode())
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, SMTPSinkHandler)
+        self.messages = 0
+        self.lock = threading.Lock()
+
+def serve_in_thread(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
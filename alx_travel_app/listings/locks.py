@@ -0,0 +1,92 @@
+"""Distributed singleton locks for periodic tasks"""
+import logging
+import threading
+import uuid
+from functools import wraps
+
+from .connections import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Only the holder of the token may extend or delete the lock
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class SingletonLock:
+    """Redis lease lock that is renewed in the background while held.
+
+    The lease expires on its own if the holder dies, so a crashed worker
+    never blocks the next run for longer than ``ttl`` seconds.
+    """
+
+    def __init__(self, name, ttl=60, client=None):
+        self.key = f"lock:{name}"
+        self.ttl_ms = int(ttl * 1000)
+        self.token = uuid.uuid4().hex
+        self.client = client or get_redis()
+        self.lost = False
+        self._stop = threading.Event()
+        self._renewer = None
+
+    def acquire(self):
+        """Try to take the lease; return False if another node holds it"""
+        if not self.client.set(self.key, self.token, nx=True, px=self.ttl_ms):
+            return False
+        self._stop.clear()
+        self._renewer = threading.Thread(target=self._renew_loop, daemon=True)
+        self._renewer.start()
+        return True
+
+    def renew(self):
+        """Extend the lease; return False if it was lost"""
+        return bool(self.client.eval(RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms))
+
+    def release(self):
+        """Stop renewing and drop the lease if we still hold it"""
+        self._stop.set()
+        if self._renewer is not None:
+            self._renewer.join()
+            self._renewer = None
+        self.client.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+
+    def _renew_loop(self):
+        interval = self.ttl_ms / 3000
+        while not self._stop.wait(interval):
+            if not self.renew():
+                self.lost = True
+                logger.warning(f"Lost lock {self.key} before release")
+                return
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+def singleton(name, ttl=60):
+    """Run the wrapped task on one node at a time, skipping overlapping runs"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            lock = SingletonLock(name, ttl=ttl)
+            if not lock.acquire():
+                logger.info(f"Skipping {name}: already running on another node")
+                return {'skipped': name}
+            try:
+                return func(*args, **kwargs)
+            finally:
+                lock.release()
+        return wrapper
+    return decorator
@@ -0,0 +1,40 @@
+import json
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from listings.analytics import OccupancyAnalytics
+
+class Command(BaseCommand):
+    """Print occupancy, lead time, ADR and demand forecasts per location"""
+    help = 'Compute booking analytics for a date window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='First night of the window (default: 365 days ago)')
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help='Night after the window (default: today)')
+        parser.add_argument('--horizon', type=int, default=28, help='Forecast days')
+        parser.add_argument('--chunk-size', type=int, default=100_000,
+                            help='Bookings read from the database per chunk')
+        parser.add_argument('--json', action='store_true', help='Print the full result as JSON')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.now().date()
+        start = options['start'] or end - timedelta(days=365)
+        summary = OccupancyAnalytics(start, end, chunk_size=options['chunk_size']).load().summary(options['horizon'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary))
+            return
+
+        self.stdout.write(f"Window {summary['start']} to {summary['end']}")
+        self.stdout.write(f"Lead time percentiles (days): {summary['lead_time_percentiles']}")
+        self.stdout.write(f"\n{'location':<20}{'listings':>9}{'bookings':>10}{'nights':>10}{'occupancy':>11}{'ADR':>10}{'next 7d':>10}")
+        for row in summary['locations']:
+            adr = f"{row['adr']:.2f}" if row['adr'] is not None else '-'
+            self.stdout.write(
+                f"{row['location'][:19]:<20}{row['listings']:>9}{row['bookings']:>10}{row['booked_nights']:>10}"
+                f"{row['occupancy_rate']:>10.1%} {adr:>9}{sum(row['forecast'][:7]):>10.1f}"
+            )
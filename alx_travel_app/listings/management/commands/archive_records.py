@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from listings.archive import archivable, archive_cutoff, archive_records
+from listings.transitions import complete_past_stays
+
+class Command(BaseCommand):
+    """Move completed and cancelled bookings, with their payments, to the archive tables"""
+    help = 'Archive finished bookings and payments in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive stays that ended more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--limit', type=int, help='Stop after archiving this many bookings')
+        parser.add_argument('--dry-run', action='store_true', help='Only count archivable bookings')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            cutoff = archive_cutoff(options['older_than_days'])
+            self.stdout.write(f"{archivable(cutoff).count()} bookings ended before {cutoff} can be archived")
+            return
+        completed = complete_past_stays(options['batch_size'])
+        self.stdout.write(f"Marked {completed} ended stays completed")
+        archived = archive_records(options['older_than_days'], options['batch_size'], options['limit'])
+        self.stdout.write(f"Archived {archived} bookings")
@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from listings.query_audit import query_stats
+
+WATCHED_TABLES = ('listings_booking', 'listings_payment', 'listings_listing')
+
+def find_seq_scans(plan, found=None):
+    """Collect watched relations read by a sequential scan anywhere in the plan"""
+    if found is None:
+        found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in WATCHED_TABLES:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        find_seq_scans(child, found)
+    return found
+
+class Command(BaseCommand):
+    """Report the most expensive captured query fingerprints and EXPLAIN them.
+
+    Fingerprints are captured at runtime when QUERY_AUDIT_ENABLED is set.
+    """
+    help = 'List top SQL fingerprints for listings tables and flag sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10,
+                            help='Number of fingerprints to report')
+        parser.add_argument('--no-explain', action='store_true',
+                            help='Skip running EXPLAIN on the sample statements')
+        parser.add_argument('--reset', action='store_true',
+                            help='Clear captured statistics after reporting')
+
+    def handle(self, *args, **options):
+        query_stats.flush()
+        entries = query_stats.top(options['top'])
+        if not entries:
+            self.stdout.write('No queries captured; set QUERY_AUDIT_ENABLED=True and exercise the app')
+
+        explain = not options['no_explain'] and connection.vendor == 'postgresql'
+        if not options['no_explain'] and not explain:
+            self.stdout.write(self.style.WARNING(f'EXPLAIN audit needs PostgreSQL, not {connection.vendor}'))
+
+        for entry in entries:
+            mean_ms = entry['total_seconds'] / max(entry['calls'], 1) * 1000
+            self.stdout.write(
+                f"\n[{entry['fingerprint']}] calls={entry['calls']} "
+                f"total={entry['total_seconds']:.3f}s mean={mean_ms:.2f}ms"
+            )
+            self.stdout.write(f"  {entry['sql']}")
+            if explain and entry['sql'].lstrip().upper().startswith('SELECT'):
+                self._explain(entry)
+
+        if options['reset']:
+            query_stats.reset()
+
+    def _explain(self, entry):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {entry['sql']}", entry['params'])
+                plan = cursor.fetchone()[0]
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f"  EXPLAIN failed: {str(e)}"))
+            return
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+        self.stdout.write(f"  plan: {root['Node Type']} cost={root['Total Cost']} rows={root['Plan Rows']}")
+        for table in find_seq_scans(root):
+            self.stdout.write(self.style.ERROR(f"  SEQ SCAN on {table}: consider an index for this filter"))
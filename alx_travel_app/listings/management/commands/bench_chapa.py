@@ -0,0 +1,54 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from listings import chapa
+from listings.loadtest.fakes import FakeChapaServer, serve_in_thread
+
+class Command(BaseCommand):
+    """Compare concurrent Chapa verify calls through the sync and async clients.
+
+    Calls go to a local fake Chapa with injected latency. The sync client is
+    driven from a thread pool of ``--threads`` workers, as a threaded WSGI
+    server would be; the async client runs every call concurrently on one
+    event loop, as the async views do under ASGI.
+    """
+    help = 'Benchmark gateway calls/sec with sync (thread per call) and async clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=500, help='Verify calls per mode')
+        parser.add_argument('--latency', type=float, default=300.0,
+                            help='Mean fake Chapa latency in milliseconds')
+        parser.add_argument('--threads', type=int, default=16,
+                            help='Worker threads for the sync client')
+        parser.add_argument('--port', type=int, default=8901)
+
+    def handle(self, *args, **options):
+        server = FakeChapaServer(('127.0.0.1', options['port']), latency=options['latency'] / 1000)
+        serve_in_thread(server)
+        calls = options['calls']
+        refs = [f"bench-{i}" for i in range(calls)]
+        try:
+            with override_settings(
+                CHAPA_BASE_URL=f"http://127.0.0.1:{options['port']}/v1",
+                CHAPA_MAX_CONNECTIONS=calls
+            ):
+                started = time.perf_counter()
+                with ThreadPoolExecutor(options['threads']) as pool:
+                    statuses = list(pool.map(lambda ref: chapa.verify(ref)[0], refs))
+                self._report(f"sync ({options['threads']} threads)", statuses, time.perf_counter() - started)
+
+                async def run():
+                    return await asyncio.gather(*(chapa.averify(ref) for ref in refs))
+                started = time.perf_counter()
+                statuses = [code for code, _ in asyncio.run(run())]
+                self._report('async (1 thread)', statuses, time.perf_counter() - started)
+        finally:
+            server.shutdown()
+
+    def _report(self, label, statuses, elapsed):
+        ok = sum(1 for code in statuses if code == 200)
+        self.stdout.write(f"{label:>20}: {len(statuses) / elapsed:8.1f} calls/sec  ({ok}/{len(statuses)} ok, {elapsed:.2f}s)")
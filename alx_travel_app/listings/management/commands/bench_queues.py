@@ -0,0 +1,59 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.models import Booking
+from listings.tasks import (
+    debug_task,
+    send_booking_confirmation_email,
+    PAYMENTS_QUEUE,
+    HIGH_PRIORITY,
+)
+
+class Command(BaseCommand):
+    """Measure payments-queue latency while the notifications queue is flooded.
+
+    Needs a running broker, result backend and at least one worker per queue,
+    e.g. the worker commands listed next to CELERY_TASK_QUEUES in settings.
+    """
+    help = 'Benchmark payment task latency with and without an email flood'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flood', type=int, default=2000,
+                            help='Number of confirmation emails to enqueue')
+        parser.add_argument('--probes', type=int, default=20,
+                            help='Number of payments-queue probe tasks per phase')
+        parser.add_argument('--timeout', type=float, default=30.0,
+                            help='Seconds to wait for each probe')
+
+    def handle(self, *args, **options):
+        idle = self._probe(options['probes'], options['timeout'])
+        self._report('idle', idle)
+
+        booking = Booking.objects.order_by('-id').only('id').first()
+        booking_id = booking.id if booking else 0
+        self.stdout.write(f"Flooding notifications with {options['flood']} emails for booking #{booking_id}")
+        for _ in range(options['flood']):
+            send_booking_confirmation_email.delay(booking_id)
+
+        flooded = self._probe(options['probes'], options['timeout'])
+        self._report('flooded', flooded)
+
+    def _probe(self, count, timeout):
+        """Return round-trip latencies in milliseconds for payments-queue probes"""
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            result = debug_task.apply_async(queue=PAYMENTS_QUEUE, priority=HIGH_PRIORITY)
+            result.get(timeout=timeout)
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies
+
+    def _report(self, label, latencies):
+        latencies = sorted(latencies)
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        self.stdout.write(
+            f"{label:>8}: p50={statistics.median(latencies):.1f}ms "
+            f"p95={p95:.1f}ms max={latencies[-1]:.1f}ms"
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from alx_travel_app.celery import app
+from listings.models import Booking
+from listings.tasks import send_booking_confirmation_email
+
+class Command(BaseCommand):
+    """Compare email task throughput with and without a stored result per task.
+
+    Tasks run eagerly in this process against the configured database, with
+    the locmem email backend, so the difference is the result-backend write.
+    """
+    help = 'Benchmark tasks/sec with stored results (before) and ignored results (after)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000,
+                            help='Number of tasks to run per mode')
+
+    def handle(self, *args, **options):
+        booking = Booking.objects.order_by('-id').only('id').first()
+        if booking is None:
+            raise CommandError('Create at least one booking before benchmarking')
+
+        task = send_booking_confirmation_email
+        original = task.ignore_result
+        app.conf.task_store_eager_result = True
+        try:
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+                for label, ignore in (('before', False), ('after', True)):
+                    task.ignore_result = ignore
+                    started = time.perf_counter()
+                    for _ in range(options['tasks']):
+                        task.apply(args=[booking.id])
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"{label:>6}: {options['tasks'] / elapsed:.1f} tasks/sec")
+        finally:
+            task.ignore_result = original
+            app.conf.task_store_eager_result = False
@@ -0,0 +1,230 @@
+import bisect
+import io
+import itertools
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from listings.models import Listing, Booking, Payment
+from listings.stats import rebuild_stats
+
+LOCATIONS = [
+    'Addis Ababa', 'Bahir Dar', 'Gondar', 'Lalibela', 'Hawassa', 'Dire Dawa', 'Mekelle',
+    'Arba Minch', 'Adama', 'Jimma', 'Axum', 'Harar', 'Debre Zeyit', 'Dessie', 'Bishoftu',
+]
+AMENITIES = ['wifi', 'kitchen', 'parking', 'pool', 'air conditioning', 'washer', 'workspace', 'breakfast']
+PAYMENT_METHODS = ['telebirr', 'cbebirr', 'card', 'mpesa']
+
+# Relative demand per month: dry-season peaks and the holiday spike
+MONTH_WEIGHTS = [1.3, 1.2, 1.0, 0.9, 0.8, 0.7, 0.8, 0.9, 1.1, 1.2, 1.3, 1.6]
+# Length of stay 1..14 nights, weighted to short stays
+NIGHT_WEIGHTS = [18, 22, 18, 12, 8, 6, 6, 3, 2, 1.5, 1, 0.8, 0.7, 1]
+
+BOOKING_COLUMNS = ('id', 'user_id', 'listing_id', 'check_in', 'check_out', 'number_of_guests',
+                   'total_price', 'status', 'special_requests', 'created_at', 'updated_at', 'reference')
+PAYMENT_COLUMNS = ('id', 'booking_id', 'transaction_id', 'tx_ref', 'chapa_transaction_id', 'amount', 'currency',
+                   'status', 'payment_method', 'payment_date', 'checkout_url', 'created_at', 'updated_at')
+LISTING_COLUMNS = ('id', 'title', 'description', 'price_per_night', 'location', 'bedrooms', 'bathrooms',
+                   'max_guests', 'amenities', 'created_at', 'updated_at', 'is_available')
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if value == '':
+        # An unquoted empty field would be read as NULL
+        return '""'
+    return str(value)
+
+class Command(BaseCommand):
+    """Generate a large, seeded dataset of listings, bookings and payments.
+
+    Rows are written with PostgreSQL COPY in batches, with ids assigned up
+    front so payments can reference their bookings without reading them
+    back. The same arguments always produce the same data. Other databases
+    fall back to bulk_create, where auto_now_add overrides the generated
+    created_at values. Neither path sends signals, so ListingStats is
+    rebuilt at the end.
+    """
+    help = 'Generate synthetic listings, bookings and payments for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000)
+        parser.add_argument('--bookings', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--start', type=date.fromisoformat, default=date(2024, 1, 1),
+                            help='First possible check-in date (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int, default=730,
+                            help='Length of the check-in window in days')
+        parser.add_argument('--today', type=date.fromisoformat, default=date(2025, 1, 1),
+                            help='Date separating past (completed) from upcoming stays')
+        parser.add_argument('--popularity-skew', type=float, default=1.1,
+                            help='Zipf exponent for listing popularity')
+        parser.add_argument('--batch-size', type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql'
+        started = time.perf_counter()
+
+        user_ids = self._create_users(options['users'])
+        listings = self._create_listings(options['listings'])
+        self._create_bookings(options, user_ids, listings)
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Listing, Booking, Payment]):
+                cursor.execute(sql)
+        for rebuilt in rebuild_stats():
+            self.stdout.write(f"\rRebuilt stats for {rebuilt} listings", ending='')
+        self.stdout.write('')
+        self.stdout.write(f"Done in {time.perf_counter() - started:.1f}s")
+
+    def _create_users(self, count):
+        existing = User.objects.filter(username__startswith='dataset_user_').count()
+        users = (
+            User(username=f"dataset_user_{i}", email=f"dataset_user_{i}@example.com", password='!')
+            for i in range(existing, count)
+        )
+        while True:
+            batch = list(itertools.islice(users, self.batch_size))
+            if not batch:
+                break
+            User.objects.bulk_create(batch)
+        return list(User.objects.filter(username__startswith='dataset_user_').order_by('id')
+                    .values_list('id', flat=True)[:count])
+
+    def _create_listings(self, count):
+        """Create listings and return (id, price, max_guests) tuples"""
+        rng = self.rng
+        next_id = (Listing.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        created = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+        listings = []
+
+        def rows():
+            for listing_id in range(next_id, next_id + count):
+                bedrooms = rng.choices([1, 2, 3, 4, 5], weights=[35, 30, 20, 10, 5])[0]
+                price = Decimal(f"{rng.lognormvariate(7.5, 0.5) * bedrooms ** 0.5:.2f}")
+                max_guests = bedrooms * 2
+                listings.append((listing_id, price, max_guests))
+                location = rng.choice(LOCATIONS)
+                yield (
+                    listing_id, f"{bedrooms}-bedroom stay in {location} #{listing_id}",
+                    f"Synthetic listing {listing_id}", price, location, bedrooms,
+                    max(1, bedrooms - rng.randint(0, 1)), max_guests,
+                    ' '.join(rng.sample(AMENITIES, rng.randint(1, 5))),
+                    created, created, rng.random() > 0.05,
+                )
+
+        self._write(Listing, LISTING_COLUMNS, rows(), count)
+        return listings
+
+    def _create_bookings(self, options, user_ids, listings):
+        rng = self.rng
+        # Zipf-distributed popularity over a shuffled listing order
+        order = listings[:]
+        rng.shuffle(order)
+        cum_popularity = list(itertools.accumulate(
+            1 / (rank ** options['popularity_skew']) for rank in range(1, len(order) + 1)
+        ))
+        start = options['start']
+        day_weights = list(itertools.accumulate(
+            MONTH_WEIGHTS[(start + timedelta(days=d)).month - 1] for d in range(options['days'])
+        ))
+        cum_nights = list(itertools.accumulate(NIGHT_WEIGHTS))
+        today = options['today']
+
+        next_booking_id = (Booking.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        next_payment_id = (Payment.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        payments = []
+
+        def rows():
+            nonlocal next_payment_id
+            for booking_id in range(next_booking_id, next_booking_id + options['bookings']):
+                listing_id, price, max_guests = order[bisect.bisect(cum_popularity, rng.random() * cum_popularity[-1])]
+                check_in = start + timedelta(days=bisect.bisect(day_weights, rng.random() * day_weights[-1]))
+                nights = bisect.bisect(cum_nights, rng.random() * cum_nights[-1]) + 1
+                check_out = check_in + timedelta(days=nights)
+                lead_days = min(int(rng.expovariate(1 / 30)), 365)
+                created = datetime.combine(check_in - timedelta(days=lead_days), dt_time(12), dt_timezone.utc)
+                total = price * nights
+
+                roll = rng.random()
+                if roll < 0.12:
+                    status, payment_status = Booking.CANCELLED, rng.choice([Payment.FAILED, Payment.REFUNDED])
+                elif roll < 0.2:
+                    status, payment_status = Booking.PENDING, rng.choice([Payment.PENDING, None])
+                elif check_out <= today:
+                    status, payment_status = Booking.COMPLETED, Payment.COMPLETED
+                else:
+                    status, payment_status = Booking.CONFIRMED, Payment.COMPLETED
+
+                if payment_status is not None:
+                    paid = created + timedelta(minutes=rng.randint(1, 30))
+                    payments.append((
+                        next_payment_id, booking_id, f"TXN-{next_payment_id:012X}",
+                        f"booking-{booking_id}-seed", f"booking-{booking_id}-seed", total, 'ETB', payment_status,
+                        rng.choice(PAYMENT_METHODS) if payment_status != Payment.PENDING else '',
+                        paid if payment_status in (Payment.COMPLETED, Payment.REFUNDED) else None,
+                        '', created, paid,
+                    ))
+                    next_payment_id += 1
+                yield (
+                    booking_id, rng.choice(user_ids), listing_id, check_in, check_out,
+                    rng.randint(1, max_guests), total, status, '', created, created,
+                    # Booking.build_reference's format, with the suffix drawn from the seeded RNG
+                    f"BOOK-{created:%Y%m%d}-{rng.getrandbits(48):012X}",
+                )
+
+        def flush_payments():
+            self._write_rows(Payment, PAYMENT_COLUMNS, payments)
+            payments.clear()
+
+        # Each booking batch is written before the payments that reference it
+        self._write(Booking, BOOKING_COLUMNS, rows(), options['bookings'], after_batch=flush_payments)
+
+    def _write(self, model, columns, rows, total, after_batch=None):
+        written = 0
+        started = time.perf_counter()
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            self._write_rows(model, columns, batch)
+            if after_batch is not None:
+                after_batch()
+            written += len(batch)
+            rate = written / (time.perf_counter() - started)
+            self.stdout.write(f"\r{model._meta.db_table}: {written}/{total} ({rate:,.0f} rows/s)", ending='')
+        self.stdout.write('')
+
+    def _write_rows(self, model, columns, rows):
+        if not rows:
+            return
+        with transaction.atomic():
+            if self.use_copy:
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write(','.join(_csv_value(value) for value in row))
+                    buffer.write('\n')
+                buffer.seek(0)
+                with connection.cursor() as cursor:
+                    cursor.copy_expert(
+                        f"COPY {model._meta.db_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                        buffer
+                    )
+            else:
+                # Column names match the model attnames (user_id, listing_id, ...)
+                model.objects.bulk_create(
+                    [model(**dict(zip(columns, row))) for row in rows],
+                    batch_size=self.batch_size
+                )
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from listings.loadtest.fakes import FakeChapaServer, SMTPSink, serve_in_thread
+from listings.models import Listing
+
+class Stats:
+    """Thread-safe latency samples per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class Command(BaseCommand):
+    """Drive the browse -> book -> pay -> webhook flow against a running server.
+
+    Starts a fake Chapa API and an SMTP sink unless --no-fakes is given. The
+    server under test must point at them, e.g.
+        CHAPA_BASE_URL=http://127.0.0.1:8900/v1 EMAIL_HOST=127.0.0.1 \\
+        EMAIL_PORT=8925 EMAIL_USE_TLS=False python manage.py runserver
+    and Celery workers must use the same email settings.
+    """
+    help = 'Run an end-to-end load test with a local fake Chapa and SMTP sink'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+        parser.add_argument('--duration', type=float, default=60.0, help='Seconds to run')
+        parser.add_argument('--book-ratio', type=float, default=0.2,
+                            help='Fraction of browse sessions that go on to book and pay')
+        parser.add_argument('--drain', type=float, default=10.0,
+                            help='Seconds to wait for queued emails after the run')
+        parser.add_argument('--chapa-port', type=int, default=8900)
+        parser.add_argument('--smtp-port', type=int, default=8925)
+        parser.add_argument('--chapa-latency', type=float, default=200.0,
+                            help='Mean fake Chapa latency in milliseconds')
+        parser.add_argument('--chapa-failure-rate', type=float, default=0.0)
+        parser.add_argument('--webhook-delay', type=float, default=1.0,
+                            help='Seconds before the fake Chapa calls the webhook')
+        parser.add_argument('--no-fakes', action='store_true',
+                            help='Do not start the fake Chapa and SMTP servers')
+        parser.add_argument('--serve-only', action='store_true',
+                            help='Only run the fake servers until interrupted')
+        parser.add_argument('--password', default='loadtest-password')
+
+    def handle(self, *args, **options):
+        chapa = smtp = None
+        if not options['no_fakes']:
+            chapa = FakeChapaServer(
+                ('127.0.0.1', options['chapa_port']),
+                latency=options['chapa_latency'] / 1000,
+                failure_rate=options['chapa_failure_rate'],
+                webhook_delay=options['webhook_delay']
+            )
+            smtp = SMTPSink(('127.0.0.1', options['smtp_port']))
+            serve_in_thread(chapa)
+            serve_in_thread(smtp)
+            self.stdout.write(
+                f"Fake Chapa on :{options['chapa_port']}, SMTP sink on :{options['smtp_port']}"
+            )
+        if options['serve_only']:
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                return
+
+        listing_ids = list(Listing.objects.filter(is_available=True).values_list('id', flat=True)[:1000])
+        if not listing_ids:
+            raise CommandError('No available listings; create some (e.g. generate_dataset) first')
+        users = self._ensure_users(options['users'], options['password'])
+
+        stats = Stats()
+        deadline = time.monotonic() + options['duration']
+        threads = [
+            threading.Thread(
+                target=self._virtual_user,
+                args=(options, username, listing_ids, deadline, stats)
+            )
+            for username in users
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        self._report(stats, elapsed)
+        if smtp is not None:
+            time.sleep(options['drain'])
+            total = elapsed + options['drain']
+            self.stdout.write(f"emails delivered: {smtp.messages} ({smtp.messages / total:.1f}/s)")
+        if chapa is not None:
+            webhooks = sorted(chapa.webhook_latencies)
+            if webhooks:
+                self.stdout.write(
+                    f"webhooks: {len(webhooks)} errors={chapa.webhook_errors} "
+                    f"p50={percentile(webhooks, 0.5) * 1000:.1f}ms p95={percentile(webhooks, 0.95) * 1000:.1f}ms"
+                )
+            chapa.shutdown()
+            smtp.shutdown()
+
+    def _ensure_users(self, count, password):
+        usernames = [f"loadtest_user_{i}" for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        for username in usernames:
+            if username not in existing:
+                User.objects.create_user(username, f"{username}@example.com", password)
+        return usernames
+
+    def _virtual_user(self, options, username, listing_ids, deadline, stats):
+        session = requests.Session()
+        session.auth = (username, options['password'])
+        base = options['base_url'].rstrip('/')
+
+        def call(endpoint, method, path, **kwargs):
+            started = time.perf_counter()
+            try:
+                response = session.request(method, f"{base}{path}", timeout=30, **kwargs)
+                ok = response.status_code < 400
+            except requests.exceptions.RequestException:
+                response, ok = None, False
+            stats.record(endpoint, time.perf_counter() - started, ok)
+            return response if ok else None
+
+        while time.monotonic() < deadline:
+            call('listing-list', 'GET', f"/api/listings/?page={random.randint(1, 5)}")
+            listing_id = random.choice(listing_ids)
+            call('listing-detail', 'GET', f"/api/listings/{listing_id}/")
+            if random.random() >= options['book_ratio']:
+                continue
+
+            check_in = timezone.now().date() + timedelta(days=random.randint(1, 365))
+            booking = call('booking-create', 'POST', '/api/bookings/', json={
+                'listing': listing_id,
+                'check_in': check_in.isoformat(),
+                'check_out': (check_in + timedelta(days=random.randint(1, 7))).isoformat(),
+                'number_of_guests': 1,
+            })
+            if booking is None:
+                continue
+            payment = call('payment-initiate', 'POST', '/api/payments/initiate/',
+                           json={'booking_id': booking.json()['id']})
+            if payment is None:
+                continue
+            transaction_id = payment.json()['transaction_id']
+            call('payment-status', 'GET', f"/api/payments/status/{transaction_id}/")
+            call('payment-verify', 'POST', '/api/payments/verify/', json={'transaction_id': transaction_id})
+
+    def _report(self, stats, elapsed):
+        self.stdout.write(f"\n{'endpoint':<18}{'count':>8}{'errors':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+        total = 0
+        for endpoint, latencies in sorted(stats.latencies.items()):
+            latencies = sorted(latencies)
+            total += len(latencies)
+            self.stdout.write(
+                f"{endpoint:<18}{len(latencies):>8}{stats.errors[endpoint]:>8}"
+                f"{len(latencies) / elapsed:>9.1f}"
+                f"{percentile(latencies, 0.50) * 1000:>7.1f}ms"
+                f"{percentile(latencies, 0.95) * 1000:>7.1f}ms"
+                f"{percentile(latencies, 0.99) * 1000:>7.1f}ms"
+            )
+        self.stdout.write(f"total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from listings.stats import rebuild_stats
+
+class Command(BaseCommand):
+    """Recompute ListingStats from live and archived bookings and payments, one listing batch at a time"""
+    help = 'Rebuild the incrementally maintained listing statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of listings per aggregation batch')
+
+    def handle(self, *args, **options):
+        for rebuilt in rebuild_stats(options['batch_size']):
+            self.stdout.write(f"\rRebuilt stats for {rebuilt} listings", ending='')
+        self.stdout.write('')
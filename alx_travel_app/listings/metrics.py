@@ -0,0 +1,161 @@
+"""Lightweight Prometheus-style metrics shared across web and worker processes.
+
+Observations are aggregated in memory and flushed to Redis every
+METRICS_FLUSH_INTERVAL seconds with one pipelined round-trip, so recording a
+metric costs a dict update on the hot path. The metrics endpoint renders the
+Redis totals, which cover every process that flushes to the same Redis.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .connections import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'metrics:'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help); only registered metrics are rendered
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by view, method and status'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by view'),
+    'http_db_queries_total': ('counter', 'Database queries issued while serving requests'),
+    'http_db_query_seconds_total': ('counter', 'Time spent in database queries while serving requests'),
+    'cache_hits_total': ('counter', 'Cache hits by view'),
+    'cache_misses_total': ('counter', 'Cache misses by view'),
+    'external_call_duration_seconds': ('histogram', 'Outbound HTTP call latency by service'),
+    'dedup_suppressed_total': ('counter', 'Task enqueues dropped by deduplication'),
+    'http_requests_throttled_total': ('counter', 'Requests refused by token-bucket throttles by scope'),
+    'http_requests_shed_total': ('counter', 'Requests refused while shedding load by view'),
+    'payments_reconciled_total': ('counter', 'Pending payments verified with Chapa by outcome'),
+    'celery_task_queue_wait_seconds': ('histogram', 'Time from publish to task start by task and queue'),
+    'celery_task_runtime_seconds': ('histogram', 'Task execution time by task'),
+    'celery_tasks_total': ('counter', 'Finished tasks by task and final state'),
+    'celery_task_retries_total': ('counter', 'Task retries by task'),
+}
+
+def _label_string(labels):
+    return ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+class MetricsRegistry:
+    """Buffers counters and histograms locally and flushes them to Redis"""
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def inc(self, name, labels=None, value=1):
+        """Add ``value`` to a counter"""
+        field = _label_string(labels or {})
+        with self._lock:
+            key = (name, field)
+            self._pending[key] = self._pending.get(key, 0) + value
+
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS):
+        """Record one observation in a cumulative histogram"""
+        field = _label_string(labels or {})
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    self._add(f'{name}_bucket', self._join(field, f'le="{bound}"'), 1)
+            self._add(f'{name}_bucket', self._join(field, 'le="+Inf"'), 1)
+            self._add(f'{name}_sum', field, value)
+            self._add(f'{name}_count', field, 1)
+
+    def flush_due(self):
+        """Whether the flush interval has elapsed"""
+        interval = self.flush_interval
+        if interval is None:
+            interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        return time.monotonic() - self._last_flush >= interval
+
+    def maybe_flush(self):
+        """Flush if the flush interval has elapsed"""
+        if self.flush_due():
+            self.flush()
+
+    def flush(self):
+        """Push buffered values to Redis in one pipeline"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for (name, field), value in pending.items():
+                pipe.hincrbyfloat(f'{KEY_PREFIX}{name}', field, value)
+            pipe.execute()
+        except Exception as e:
+            # Metrics must never break the request or task they describe
+            logger.warning(f"Failed to flush metrics: {str(e)}")
+
+    def _add(self, name, field, value):
+        key = (name, field)
+        self._pending[key] = self._pending.get(key, 0) + value
+
+    @staticmethod
+    def _join(*parts):
+        return ','.join(part for part in parts if part)
+
+registry = MetricsRegistry()
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def render():
+    """Render all registered metrics in the Prometheus text exposition format"""
+    client = get_redis()
+    pipe = client.pipeline(transaction=False)
+    series = []
+    for name, (kind, _) in METRICS.items():
+        suffixes = ('_bucket', '_sum', '_count') if kind == 'histogram' else ('',)
+        for suffix in suffixes:
+            series.append(name + suffix)
+            pipe.hgetall(f'{KEY_PREFIX}{name}{suffix}')
+    values = dict(zip(series, pipe.execute()))
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        suffixes = ('_bucket', '_sum', '_count') if kind == 'histogram' else ('',)
+        for suffix in suffixes:
+            for field, value in sorted(values[name + suffix].items()):
+                field = field.decode()
+                labels = f'{{{field}}}' if field else ''
+                lines.append(f'{name}{suffix}{labels} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+# Per-request counters, set by PerformanceMetricsMiddleware
+request_stats = contextvars.ContextVar('request_stats', default=None)
+
+def record_cache(hit):
+    """Count a cache lookup against the current request"""
+    stats = request_stats.get()
+    if stats is not None:
+        stats['cache_hits' if hit else 'cache_misses'] += 1
+
+@contextmanager
+def timed_external(service):
+    """Time an outbound call, e.g. ``with timed_external('chapa'): ...``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = request_stats.get()
+        view = stats['view'] if stats is not None else 'none'
+        registry.observe(
+            'external_call_duration_seconds',
+            time.perf_counter() - started,
+            {'service': service, 'view': view}
+        )
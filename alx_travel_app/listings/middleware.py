@@ -0,0 +1,171 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from .metrics import registry, request_stats
+from .profiling import SamplingProfiler, should_profile_request
+from .query_audit import query_stats
+from .throttling import db_load
+
+def _record_query(execute, sql, params, many, context):
+    """Time a query for the request whose stats are in ``request_stats``"""
+    stats = request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats['queries'] += 1
+        stats['query_time'] += elapsed
+        if settings.QUERY_AUDIT_ENABLED:
+            query_stats.record(sql, params, elapsed)
+
+def _install_query_timer(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+# Async views run their queries in executor threads, each with its own
+# connection, so the timer is installed on every connection as it opens and
+# attributes queries through the request_stats context variable
+connection_created.connect(_install_query_timer)
+
+
+class PerformanceMetricsMiddleware:
+    """Record per-view latency, query count/time and cache hits for every request.
+
+    Place it first in MIDDLEWARE so the latency covers the whole stack.
+    Supports both sync and async requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _install_query_timer(connection)
+        token, started = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = request_stats.get()
+            request_stats.reset(token)
+        self._finish(request, response, stats, time.perf_counter() - started)
+        self._flush()
+        return response
+
+    async def __acall__(self, request):
+        token, started = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stats = request_stats.get()
+            request_stats.reset(token)
+        self._finish(request, response, stats, time.perf_counter() - started)
+        if self._flush_due():
+            # Flushing is a blocking Redis round-trip, so keep it off the event loop
+            await sync_to_async(self._flush, thread_sensitive=False)()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = request_stats.get()
+        if stats is not None and request.resolver_match is not None:
+            # URL names keep label cardinality bounded (e.g. "booking-detail")
+            stats['view'] = request.resolver_match.view_name or view_func.__name__
+        return None
+
+    @staticmethod
+    def _begin():
+        token = request_stats.set({
+            'view': 'unmatched',
+            'queries': 0,
+            'query_time': 0.0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+        })
+        return token, time.perf_counter()
+
+    @staticmethod
+    def _finish(request, response, stats, duration):
+        view = {'view': stats['view']}
+        registry.inc('http_requests_total', {
+            'view': stats['view'],
+            'method': request.method,
+            'status': response.status_code,
+        })
+        registry.observe('http_request_duration_seconds', duration, view)
+        if stats['queries']:
+            registry.inc('http_db_queries_total', view, stats['queries'])
+            registry.inc('http_db_query_seconds_total', view, stats['query_time'])
+            db_load.observe(stats['query_time'], stats['queries'])
+        if stats['cache_hits']:
+            registry.inc('cache_hits_total', view, stats['cache_hits'])
+        if stats['cache_misses']:
+            registry.inc('cache_misses_total', view, stats['cache_misses'])
+
+    @staticmethod
+    def _flush_due():
+        return registry.flush_due() or (settings.QUERY_AUDIT_ENABLED and query_stats.flush_due())
+
+    @staticmethod
+    def _flush():
+        registry.maybe_flush()
+        if settings.QUERY_AUDIT_ENABLED:
+            query_stats.maybe_flush()
+
+
+class ProfilingMiddleware:
+    """Profile selected requests with the sampling profiler.
+
+    The profile path is returned in the ``X-Profile-Path`` response header.
+    Async requests are sampled on the event loop thread, so their profiles
+    also contain whatever else the loop ran meanwhile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_profile_request(request):
+            return self.get_response(request)
+        
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        return self._attach(request, response, profiler)
+
+    async def __acall__(self, request):
+        if not should_profile_request(request):
+            return await self.get_response(request)
+        
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.stop()
+        return self._attach(request, response, profiler)
+
+    @staticmethod
+    def _attach(request, response, profiler):
+        name = request.resolver_match.view_name if request.resolver_match else request.path
+        response['X-Profile-Path'] = profiler.write('request', name)
+        return response
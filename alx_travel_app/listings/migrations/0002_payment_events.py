@@ -0,0 +1,69 @@
+import json
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_raw_responses(apps, schema_editor):
+    """Copy each raw_response into a PaymentEvent and keep its checkout URL"""
+    Payment = apps.get_model('listings', 'Payment')
+    PaymentEvent = apps.get_model('listings', 'PaymentEvent')
+    payments = Payment.objects.exclude(raw_response=None).only('id', 'raw_response').iterator(chunk_size=2000)
+    events = []
+    for payment in payments:
+        data = payment.raw_response
+        if not isinstance(data, dict):
+            data = {'raw': data}
+        checkout_url = (data.get('data') or {}).get('checkout_url')
+        if checkout_url:
+            Payment.objects.filter(id=payment.id).update(checkout_url=checkout_url[:500])
+        # Only the latest payload survived; infer which call produced it
+        if checkout_url:
+            source = 'initialize'
+        elif 'tx_ref' in data:
+            source = 'webhook'
+        else:
+            source = 'verify'
+        events.append(PaymentEvent(
+            payment_id=payment.id,
+            source=source,
+            payload=zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+        ))
+        if len(events) >= 2000:
+            PaymentEvent.objects.bulk_create(events)
+            events = []
+    PaymentEvent.objects.bulk_create(events)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='checkout_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('initialize', 'Initialize'), ('verify', 'Verify'), ('webhook', 'Webhook')], max_length=20)),
+                ('payload', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='listings.payment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['payment', 'created_at'], name='payment_event_created_idx')],
+            },
+        ),
+        migrations.RunPython(move_raw_responses, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='payment',
+            name='raw_response',
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def backfill(apps, schema_editor):
+    """Store booking references and tx_refs for existing rows, in id batches"""
+    Booking = apps.get_model('listings', 'Booking')
+    Payment = apps.get_model('listings', 'Payment')
+
+    last_id = 0
+    while True:
+        batch = list(
+            Booking.objects.filter(id__gt=last_id, reference=None)
+            .order_by('id').only('id', 'created_at')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for booking in batch:
+            booking.reference = f"BOOK-{booking.id:06d}-{booking.created_at.strftime('%Y%m%d')}"
+        Booking.objects.bulk_update(batch, ['reference'])
+        last_id = batch[-1].id
+
+    # Webhooks used to match tx_ref against chapa_transaction_id
+    Payment.objects.filter(tx_ref=None).exclude(chapa_transaction_id=None).update(
+        tx_ref=models.F('chapa_transaction_id')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_payment_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='reference',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='tx_ref',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_archive_tables'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentevent',
+            name='source',
+            field=models.CharField(choices=[('initialize', 'Initialize'), ('verify', 'Verify'), ('webhook', 'Webhook'), ('refund', 'Refund')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='paymenteventarchive',
+            name='source',
+            field=models.CharField(choices=[('initialize', 'Initialize'), ('verify', 'Verify'), ('webhook', 'Webhook'), ('refund', 'Refund')], max_length=20),
+        ),
+    ]
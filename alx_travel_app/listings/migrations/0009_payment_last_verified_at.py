@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_payment_event_refund_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='last_verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,11 @@
+import json
+import uuid
+import zlib
+
 from django.db import models
 from django.contrib.auth.models import User
-from django.core.validators import MinValueValidator
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 class Listing(models.Model):
     """Property listing model"""
@@ -15,10 +20,43 @@ class Listing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_available = models.BooleanField(default=True)
+    weekend_uplift_percent = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0,
+        validators=[MinValueValidator(0)],
+        help_text='Extra percentage charged for Friday and Saturday nights'
+    )
     
     def __str__(self):
         return self.title
 
+class SeasonalRate(models.Model):
+    """Nightly price override for a listing between two dates"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='seasonal_rates')
+    start_date = models.DateField()
+    end_date = models.DateField(help_text='First night not covered by this rate')
+    price_per_night = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    
+    class Meta:
+        indexes = [models.Index(fields=['listing', 'start_date', 'end_date'], name='seasonal_rate_dates_idx')]
+    
+    def __str__(self):
+        return f"{self.listing} {self.start_date} - {self.end_date}: {self.price_per_night}"
+
+class LengthOfStayDiscount(models.Model):
+    """Percentage off the whole stay when it is at least ``min_nights`` long"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='stay_discounts')
+    min_nights = models.PositiveIntegerField()
+    discount_percent = models.DecimalField(
+        max_digits=5, decimal_places=2,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    
+    class Meta:
+        unique_together = ('listing', 'min_nights')
+    
+    def __str__(self):
+        return f"{self.listing} {self.min_nights}+ nights: -{self.discount_percent}%"
+
 class Booking(models.Model):
     """Booking model"""
     PENDING = 'pending'
@@ -43,14 +81,25 @@ class Booking(models.Model):
     special_requests = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    reference = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False)
+    
+    class Meta:
+        # Availability checks filter on listing and a date range
+        indexes = [models.Index(fields=['listing', 'check_in', 'check_out'], name='booking_listing_dates_idx')]
     
     def __str__(self):
         return f"Booking #{self.id} - {self.user.username} - {self.listing.title}"
     
-    @property
-    def reference(self):
-        """Generate a unique booking reference"""
-        return f"BOOK-{self.id:06d}-{self.created_at.strftime('%Y%m%d')}"
+    def build_reference(self):
+        """Build a booking reference from the creation date and a random suffix"""
+        created = self.created_at or timezone.now()
+        return f"BOOK-{created.strftime('%Y%m%d')}-{uuid.uuid4().hex[:12].upper()}"
+    
+    def save(self, *args, **kwargs):
+        """Assign the reference before the insert so the row is written once"""
+        if not self.reference:
+            self.reference = self.build_reference()
+        super().save(*args, **kwargs)
 
 class Payment(models.Model):
     """Payment model for tracking payment transactions"""
@@ -68,13 +117,15 @@ class Payment(models.Model):
     
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='payment')
     transaction_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    tx_ref = models.CharField(max_length=100, unique=True, blank=True, null=True)  # tx_ref we sent to Chapa
     chapa_transaction_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     currency = models.CharField(max_length=3, default='ETB')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
     payment_method = models.CharField(max_length=50, blank=True)
     payment_date = models.DateTimeField(null=True, blank=True)
-    raw_response = models.JSONField(null=True, blank=True)  # Store raw response from Chapa
+    checkout_url = models.URLField(max_length=500, blank=True)  # Chapa hosted checkout page
+    last_verified_at = models.DateTimeField(null=True, blank=True)  # last reconciliation lookup
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -84,6 +135,139 @@ class Payment(models.Model):
     def save(self, *args, **kwargs):
         """Generate transaction ID if not provided"""
         if not self.transaction_id:
-            import uuid
             self.transaction_id = f"TXN-{uuid.uuid4().hex[:12].upper()}"
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class PaymentEvent(models.Model):
+    """Append-only, compressed log of Chapa payloads for a payment.
+
+    Kept out of the Payment row so status reads never load gateway JSON.
+    """
+    INITIALIZE = 'initialize'
+    VERIFY = 'verify'
+    WEBHOOK = 'webhook'
+    REFUND = 'refund'
+    
+    SOURCE_CHOICES = [
+        (INITIALIZE, 'Initialize'),
+        (VERIFY, 'Verify'),
+        (WEBHOOK, 'Webhook'),
+        (REFUND, 'Refund'),
+    ]
+    
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='events')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    payload = models.BinaryField()  # zlib-compressed JSON
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['payment', 'created_at'], name='payment_event_created_idx')]
+    
+    def __str__(self):
+        return f"{self.get_source_display()} event for payment #{self.payment_id}"
+    
+    @staticmethod
+    def compress(data):
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+    
+    @property
+    def data(self):
+        """Decompressed payload"""
+        return json.loads(zlib.decompress(bytes(self.payload)))
+    
+    @classmethod
+    def record(cls, payment, source, data):
+        """Append a gateway payload for ``payment``"""
+        return cls.objects.create(payment=payment, source=source, payload=cls.compress(data))
+
+class ListingStats(models.Model):
+    """Precomputed per-listing counters, kept current as bookings change.
+
+    Updated incrementally by listings.stats; the nightly
+    ``rebuild_listing_stats`` task (or ``manage.py rebuild_listing_stats``)
+    recomputes them from the source tables.
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    bookings_count = models.PositiveIntegerField(default=0)
+    confirmed_count = models.PositiveIntegerField(default=0)
+    booked_nights = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'listing stats'
+        indexes = [models.Index(fields=['-confirmed_count'], name='listing_stats_popular_idx')]
+    
+    def __str__(self):
+        return f"Stats for {self.listing}"
+    
+    @property
+    def occupancy_rate(self):
+        """Share of nights booked since the listing was created"""
+        days_listed = max((timezone.now() - self.listing.created_at).days, 1)
+        return min(self.booked_nights / days_listed, 1.0)
+
+class BookingArchive(models.Model):
+    """Completed or cancelled booking moved out of the live table.
+
+    Rows keep their original id and reference, so lookups fall back here
+    transparently once ``listings.archive`` has moved a booking.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings')
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='archived_bookings')
+    check_in = models.DateField()
+    check_out = models.DateField()
+    number_of_guests = models.IntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    special_requests = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    reference = models.CharField(max_length=32, unique=True, null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['user', '-check_in'], name='booking_archive_user_idx')]
+    
+    def __str__(self):
+        return f"Archived booking #{self.id} - {self.reference}"
+
+class PaymentArchive(models.Model):
+    """Payment of an archived booking"""
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.OneToOneField(BookingArchive, on_delete=models.CASCADE, related_name='payment')
+    transaction_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    tx_ref = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    chapa_transaction_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=50, blank=True)
+    payment_date = models.DateTimeField(null=True, blank=True)
+    checkout_url = models.URLField(max_length=500, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Archived payment #{self.id} - {self.status}"
+
+class PaymentEventArchive(models.Model):
+    """Gateway payload of an archived payment"""
+    id = models.BigIntegerField(primary_key=True)
+    payment = models.ForeignKey(PaymentArchive, on_delete=models.CASCADE, related_name='events')
+    source = models.CharField(max_length=20, choices=PaymentEvent.SOURCE_CHOICES)
+    payload = models.BinaryField()  # zlib-compressed JSON
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [models.Index(fields=['payment', 'created_at'], name='payment_event_archive_idx')]
+    
+    def __str__(self):
+        return f"{self.get_source_display()} event for archived payment #{self.payment_id}"
+    
+    @property
+    def data(self):
+        """Decompressed payload"""
+        return json.loads(zlib.decompress(bytes(self.payload)))
@@ -0,0 +1,108 @@
+"""Vectorized stay pricing.
+
+A quote for many listings is evaluated as a listings x nights price matrix:
+start from each listing's base rate, overlay seasonal rates, apply the weekend
+uplift to Friday and Saturday nights, sum each row, then take off the best
+length-of-stay discount. The rule tables are loaded with one query each.
+
+Prices are held in integer cents and percentages in basis points, so every
+step is exact; each uplifted night and the discounted total are rounded half
+up to the cent.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+from .models import Listing, SeasonalRate, LengthOfStayDiscount
+
+# date.weekday() values for Friday and Saturday nights
+WEEKEND_NIGHTS = (4, 5)
+CENT = Decimal('0.01')
+
+def _cents(amount):
+    """Decimal amount (or percentage) with two places as an integer count of hundredths"""
+    return int((amount * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+def _money(cents):
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+def _divide_half_up(numerator, denominator):
+    """Integer division of non-negative values, rounding halves up"""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+def quote_listings(listing_ids, check_in, check_out):
+    """Price a stay for each available listing in ``listing_ids``.
+
+    Returns ``{listing_id: {'total', 'average_nightly', 'discount_percent'}}``;
+    unknown or unavailable listings are left out.
+    """
+    nights = (check_out - check_in).days
+    rows = list(
+        Listing.objects.filter(id__in=listing_ids, is_available=True)
+        .values_list('id', 'price_per_night', 'weekend_uplift_percent')
+    )
+    if not rows or nights <= 0:
+        return {}
+    
+    ids = [row[0] for row in rows]
+    index = {listing_id: position for position, listing_id in enumerate(ids)}
+    base = np.array([_cents(row[1]) for row in rows], dtype=np.int64)
+    uplift = np.array([_cents(row[2]) for row in rows], dtype=np.int64)
+    nightly = np.repeat(base[:, None], nights, axis=1)
+    day = np.arange(nights)
+    
+    # Seasonal overrides. Where rates overlap, the latest-starting one (then
+    # the newest) wins: each covered cell keeps the highest rank among the
+    # rates covering it, which np.maximum.at computes deterministically
+    rates = list(
+        SeasonalRate.objects.filter(listing_id__in=ids, start_date__lt=check_out, end_date__gt=check_in)
+        .order_by('start_date', 'id')
+        .values_list('listing_id', 'start_date', 'end_date', 'price_per_night')
+    )
+    if rates:
+        rate_rows = np.array([index[rate[0]] for rate in rates])
+        starts = np.array([(rate[1] - check_in).days for rate in rates])
+        ends = np.array([(rate[2] - check_in).days for rate in rates])
+        prices = np.array([_cents(rate[3]) for rate in rates], dtype=np.int64)
+        covered = (day[None, :] >= starts[:, None]) & (day[None, :] < ends[:, None])
+        rank, night_index = np.nonzero(covered)
+        winner = np.full(nightly.shape, -1)
+        np.maximum.at(winner, (rate_rows[rank], night_index), rank)
+        seasonal = winner >= 0
+        nightly[seasonal] = prices[winner[seasonal]]
+    
+    weekend = np.isin((day + check_in.weekday()) % 7, WEEKEND_NIGHTS)
+    nightly = np.where(
+        weekend[None, :],
+        _divide_half_up(nightly * (10000 + uplift[:, None]), 10000),
+        nightly
+    )
+    subtotal = nightly.sum(axis=1)
+    
+    # Best applicable length-of-stay discount per listing, in basis points
+    discount = np.zeros(len(ids), dtype=np.int64)
+    stay_discounts = list(
+        LengthOfStayDiscount.objects.filter(listing_id__in=ids, min_nights__lte=nights)
+        .values_list('listing_id', 'discount_percent')
+    )
+    if stay_discounts:
+        np.maximum.at(
+            discount,
+            [index[listing_id] for listing_id, _ in stay_discounts],
+            [_cents(percent) for _, percent in stay_discounts]
+        )
+    totals = _divide_half_up(subtotal * (10000 - discount), 10000)
+    
+    return {
+        listing_id: {
+            'total': _money(totals[position]),
+            'average_nightly': (_money(totals[position]) / nights).quantize(CENT, rounding=ROUND_HALF_UP),
+            'discount_percent': _money(discount[position]),
+        }
+        for listing_id, position in index.items()
+    }
+
+def quote_stay(listing, check_in, check_out):
+    """Total price for one stay, using the same rules as batch quotes"""
+    quote = quote_listings([listing.id], check_in, check_out).get(listing.id)
+    return quote['total'] if quote else listing.price_per_night * (check_out - check_in).days
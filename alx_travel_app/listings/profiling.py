@@ -0,0 +1,117 @@
+"""Opt-in sampling profiler for requests and Celery tasks.
+
+A background thread samples the profiled thread's stack every
+PROFILING_INTERVAL_MS milliseconds and the result is written in the
+collapsed-stack format read by flamegraph.pl and speedscope. Nothing runs
+unless a request or task is selected, so the disabled cost is one check.
+
+A request is profiled when it carries a valid ``X-Profile`` header (see
+``make_profile_token``) or is picked by PROFILING_SAMPLE_RATE. A task is
+profiled when it is declared with ``profile=True``, is sent with a
+``profile`` header, or is picked by PROFILING_TASK_SAMPLE_RATE.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+SIGNING_SALT = 'listings.profiling'
+
+class SamplingProfiler:
+    """Samples one thread's call stack at a fixed interval"""
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        if interval is None:
+            interval = getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, kind, name):
+        """Write collapsed stacks to PROFILING_OUTPUT_DIR and return the path"""
+        output_dir = settings.PROFILING_OUTPUT_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+        filename = f"{kind}-{safe_name}-{int(time.time())}-{uuid.uuid4().hex[:8]}.folded"
+        path = os.path.join(output_dir, filename)
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+def make_profile_token():
+    """Return a signed value for the X-Profile header"""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign('profile')
+
+def should_profile_request(request):
+    """Whether this request was asked for by a signed header or sampled"""
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        try:
+            signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+                token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+            )
+            return True
+        except signing.BadSignature:
+            logger.warning("Ignoring invalid profiling token")
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+def should_profile_task(task):
+    if getattr(task, 'profile', False) or task.request.get('profile'):
+        return True
+    rate = settings.PROFILING_TASK_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+_task_profilers = {}
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, **kwargs):
+    if should_profile_task(task):
+        profiler = SamplingProfiler()
+        profiler.start()
+        _task_profilers[task_id] = profiler
+
+@task_postrun.connect
+def stop_task_profile(task_id=None, task=None, **kwargs):
+    profiler = _task_profilers.pop(task_id, None)
+    if profiler is not None:
+        profiler.stop()
+        path = profiler.write('task', task.name)
+        logger.info(f"Wrote profile for task {task.name} to {path}")
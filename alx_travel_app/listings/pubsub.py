@@ -0,0 +1,93 @@
+"""Payment status notifications over Redis pub/sub.
+
+Transitions publish to ``payment-status:<transaction_id>`` after commit, and
+the server-sent events stream forwards those messages to the waiting client,
+so a client watching a checkout holds one idle connection instead of polling
+the status endpoint.
+"""
+import asyncio
+import json
+import logging
+
+import redis
+from django.conf import settings
+
+from .connections import get_async_redis, get_redis
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a payment no longer changes
+FINAL_STATUSES = (Payment.COMPLETED, Payment.REFUNDED)
+
+def channel(transaction_id):
+    """Pub/sub channel carrying status changes of one payment"""
+    return f"payment-status:{transaction_id}"
+
+def status_message(transaction_id, payment_status, updated_at):
+    """Body published on a payment's channel and sent as the SSE event data"""
+    return {
+        'transaction_id': str(transaction_id),
+        'status': payment_status,
+        'updated_at': updated_at.isoformat() if updated_at else None
+    }
+
+def publish_statuses(messages):
+    """Publish a batch of status messages in one round trip.
+
+    Publishing is best effort: clients still get the current status when they
+    reconnect, so a Redis outage must not fail the transition itself.
+    """
+    if not messages:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for message in messages:
+            pipe.publish(channel(message['transaction_id']), json.dumps(message))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to publish {len(messages)} payment status messages: {e}")
+
+def publish_payment_status(payment):
+    """Publish the current status of ``payment``"""
+    publish_statuses([status_message(payment.transaction_id, payment.status, payment.updated_at)])
+
+def sse_event(data, event='status'):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def subscribe(transaction_id):
+    """Subscribe to a payment's channel; do this before reading its status"""
+    pubsub = get_async_redis().pubsub()
+    await pubsub.subscribe(channel(transaction_id))
+    return pubsub
+
+async def status_stream(pubsub, snapshot):
+    """Yield ``snapshot`` and then every published status change as SSE.
+
+    The stream ends once the payment reaches a final status or after
+    PAYMENT_STREAM_TIMEOUT seconds; EventSource clients reconnect on their
+    own. Comment lines every PAYMENT_STREAM_HEARTBEAT seconds keep proxies
+    from closing the idle connection.
+    """
+    loop_time = asyncio.get_running_loop().time
+    deadline = loop_time() + settings.PAYMENT_STREAM_TIMEOUT
+    try:
+        yield 'retry: 3000\n\n'
+        yield sse_event(snapshot)
+        if snapshot['status'] in FINAL_STATUSES:
+            return
+        
+        while loop_time() < deadline:
+            timeout = min(settings.PAYMENT_STREAM_HEARTBEAT, max(deadline - loop_time(), 0))
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            data = json.loads(message['data'])
+            yield sse_event(data)
+            if data['status'] in FINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.reset()
@@ -0,0 +1,113 @@
+"""SQL fingerprinting for queries issued against the listings tables.
+
+When QUERY_AUDIT_ENABLED is set, PerformanceMetricsMiddleware passes every
+listings query through ``query_stats.record``. Queries are normalized into
+fingerprints, aggregated in memory and flushed to Redis together with one
+sample statement and its parameters, which ``manage.py audit_queries``
+later runs EXPLAIN on.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from .connections import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'querystats:'
+AUDITED_TABLE_PREFIX = 'listings_'
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize(sql):
+    """Replace literals and IN-lists so equivalent queries share one shape"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    return _WHITESPACE.sub(' ', sql).strip()
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+class QueryStats:
+    """Per-fingerprint call counts and total time, flushed to Redis"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, sql, params, duration):
+        if AUDITED_TABLE_PREFIX not in sql:
+            return
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [1, duration, sql, params]
+            else:
+                entry[0] += 1
+                entry[1] += duration
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+    def maybe_flush(self):
+        if self.flush_due():
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for key, (count, seconds, sql, params) in pending.items():
+                pipe.hincrby(f'{KEY_PREFIX}count', key, count)
+                pipe.hincrbyfloat(f'{KEY_PREFIX}seconds', key, seconds)
+                pipe.hsetnx(f'{KEY_PREFIX}sql', key, sql)
+                pipe.hsetnx(f'{KEY_PREFIX}params', key, json.dumps(list(params or ()), default=str))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to flush query stats: {str(e)}")
+
+    def top(self, limit=10):
+        """Return the fingerprints with the most total time, slowest first"""
+        client = get_redis()
+        seconds = client.hgetall(f'{KEY_PREFIX}seconds')
+        ranked = sorted(seconds.items(), key=lambda item: float(item[1]), reverse=True)[:limit]
+        pipe = client.pipeline(transaction=False)
+        for key, _ in ranked:
+            pipe.hget(f'{KEY_PREFIX}count', key)
+            pipe.hget(f'{KEY_PREFIX}sql', key)
+            pipe.hget(f'{KEY_PREFIX}params', key)
+        values = pipe.execute()
+        
+        results = []
+        for index, (key, total) in enumerate(ranked):
+            calls, sql, params = values[index * 3:index * 3 + 3]
+            results.append({
+                'fingerprint': key.decode(),
+                'calls': int(calls or 0),
+                'total_seconds': float(total),
+                'sql': sql.decode() if sql else '',
+                'params': json.loads(params) if params else [],
+            })
+        return results
+
+    def reset(self):
+        client = get_redis()
+        client.delete(*(f'{KEY_PREFIX}{name}' for name in ('count', 'seconds', 'sql', 'params')))
+
+query_stats = QueryStats()
@@ -0,0 +1,132 @@
+"""Verify pending payments against Chapa in bulk.
+
+Payments whose webhook never arrived are looked up with concurrent verify
+calls on one event loop, at most CHAPA_VERIFY_CONCURRENCY in flight and
+CHAPA_VERIFY_RATE started per second, so a backlog of thousands resolves in
+seconds instead of one blocking call at a time. Each paid payment is
+completed in its own short transaction; the chunk's events and lookup
+stamps are then written in bulk.
+
+Every lookup stamps ``Payment.last_verified_at``. A payment is looked up
+again only once the time since its last lookup is at least its age at that
+lookup, so the gap doubles each time, and payments older than
+PAYMENT_RECONCILE_MAX_AGE are no longer looked up at all. Gateway payloads
+are only logged when they change the payment's status.
+"""
+import asyncio
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Q, Value
+from django.utils import timezone
+
+from . import chapa
+from .metrics import registry
+from .models import Payment, PaymentEvent
+from .transitions import complete_payment
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Spaces out call starts to at most ``rate`` per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def _verify_all(references):
+    semaphore = asyncio.Semaphore(settings.CHAPA_VERIFY_CONCURRENCY)
+    limiter = RateLimiter(settings.CHAPA_VERIFY_RATE)
+    
+    async def verify(reference):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                return await chapa.averify(reference)
+            except chapa.ChapaError as e:
+                logger.warning(f"Could not verify payment {reference}: {e}")
+                return None
+    
+    try:
+        return await asyncio.gather(*(verify(reference) for reference in references))
+    finally:
+        await chapa.aclose()
+
+def due_for_verification(now=None):
+    """Pending payments the reconciler should look up now.
+
+    Old enough for their webhook to have arrived, younger than
+    PAYMENT_RECONCILE_MAX_AGE, and never looked up or backed off long enough.
+    """
+    now = now or timezone.now()
+    return Payment.objects.filter(
+        status=Payment.PENDING,
+        created_at__lt=now - timedelta(seconds=settings.PAYMENT_RECONCILE_AFTER),
+        created_at__gte=now - timedelta(seconds=settings.PAYMENT_RECONCILE_MAX_AGE)
+    ).alias(
+        since_lookup=ExpressionWrapper(
+            Value(now, output_field=DateTimeField()) - F('last_verified_at'),
+            output_field=DurationField()
+        ),
+        age_at_lookup=ExpressionWrapper(F('last_verified_at') - F('created_at'), output_field=DurationField())
+    ).filter(Q(last_verified_at=None) | Q(since_lookup__gte=F('age_at_lookup')))
+
+def reconcile_payments(payments, record_unpaid=False):
+    """Verify ``payments`` with Chapa and complete the ones it reports paid.
+
+    Load them with ``select_related('booking__user')``. Returns payment ids
+    by outcome: ``completed``, ``unpaid`` (Chapa answered, not paid) and
+    ``errors`` (Chapa could not be asked). Payloads are logged for completed
+    payments, and for unpaid ones too when ``record_unpaid`` is set because
+    the caller is about to expire them.
+    """
+    outcome = {'completed': [], 'unpaid': [], 'errors': []}
+    if not payments:
+        return outcome
+    
+    results = asyncio.run(_verify_all([p.tx_ref or p.chapa_transaction_id for p in payments]))
+    
+    events = []
+    # complete_payment commits each payment on its own, so the listing rows
+    # nights_taken locks are held briefly and never several at a time
+    for payment, result in zip(payments, results):
+        if result is None:
+            outcome['errors'].append(payment.id)
+            continue
+        status_code, response_data = result
+        paid = chapa.is_paid(status_code, response_data)
+        if paid or record_unpaid:
+            events.append(PaymentEvent(
+                payment=payment,
+                source=PaymentEvent.VERIFY,
+                payload=PaymentEvent.compress(response_data)
+            ))
+        if paid:
+            complete_payment(payment, response_data.get('data', {}).get('payment_method', ''))
+            outcome['completed'].append(payment.id)
+        else:
+            outcome['unpaid'].append(payment.id)
+    
+    with transaction.atomic():
+        PaymentEvent.objects.bulk_create(events)
+        # Failed lookups back off too, so an unreachable gateway is not hammered
+        Payment.objects.filter(id__in=[payment.id for payment in payments]).update(last_verified_at=timezone.now())
+    
+    for name, ids in outcome.items():
+        if ids:
+            registry.inc('payments_reconciled_total', {'outcome': name}, len(ids))
+    return outcome
@@ -1,7 +1,17 @@
+import logging
+from datetime import timedelta
+
+import redis
 from rest_framework import serializers
-from .models import Listing, Booking, Payment
+from .models import Listing, Booking, Payment, BookingArchive
+from .holds import get_hold_store
+from .pricing import quote_stay
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+
 class ListingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Listing
@@ -32,10 +42,69 @@ class BookingSerializer(serializers.ModelSerializer):
         if data['number_of_guests'] > listing.max_guests:
             raise serializers.ValidationError(f"Maximum guests allowed is {listing.max_guests}")
         
-        # Calculate total price
-        nights = (data['check_out'] - data['check_in']).days
-        data['total_price'] = listing.price_per_night * nights
+        # Hold the nights before touching the database, so concurrent
+        # checkouts for the same dates are turned away by the hold store
+        request = self.context.get('request')
+        owner = request.user.id if request and request.user.is_authenticated else None
+        store = get_hold_store()
+        fresh_nights = []
+        if owner is not None:
+            try:
+                fresh_nights = store.acquire(
+                    listing.id, data['check_in'], data['check_out'], owner, settings.BOOKING_HOLD_TTL
+                )
+            except redis.RedisError as e:
+                # Holds only spare the database; the overlap check below decides
+                logger.warning(f"Booking without a checkout hold: {e}")
+                fresh_nights = []
+            if fresh_nights is None:
+                raise serializers.ValidationError("These dates are being booked by another guest, please try again shortly")
         
+        # Pending bookings only block their dates while their hold would
+        hold_cutoff = timezone.now() - timedelta(seconds=settings.BOOKING_HOLD_TTL)
+        overlapping = Booking.objects.filter(
+            listing=listing,
+            check_in__lt=data['check_out'],
+            check_out__gt=data['check_in']
+        ).filter(
+            Q(status=Booking.CONFIRMED) | Q(status=Booking.PENDING, created_at__gte=hold_cutoff)
+        )
+        if self.instance is not None:
+            overlapping = overlapping.exclude(pk=self.instance.pk)
+        if overlapping.exists():
+            # Nights the owner already held belong to their earlier booking
+            try:
+                store.release_nights(listing.id, fresh_nights, owner)
+            except redis.RedisError as e:
+                logger.warning(f"Failed to release checkout holds: {e}")
+            raise serializers.ValidationError("Listing is not available for the selected dates")
+        
+        # Calculate total price with seasonal, weekend and length-of-stay rules
+        data['total_price'] = quote_stay(listing, data['check_in'], data['check_out'])
+        
+        return data
+
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    """Read-only representation of an archived booking, shaped like BookingSerializer"""
+    user = serializers.StringRelatedField(read_only=True)
+    
+    class Meta:
+        model = BookingArchive
+        fields = '__all__'
+        read_only_fields = [f.name for f in BookingArchive._meta.fields]
+
+class QuoteRequestSerializer(serializers.Serializer):
+    listing_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=500)
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    
+    def validate(self, data):
+        """Validate the quoted stay"""
+        nights = (data['check_out'] - data['check_in']).days
+        if nights <= 0:
+            raise serializers.ValidationError("Check-out date must be after check-in date")
+        if nights > 365:
+            raise serializers.ValidationError("Stays longer than 365 nights cannot be quoted")
         return data
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -44,8 +113,8 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
-        read_only_fields = ('transaction_id', 'chapa_transaction_id', 'status', 
-                           'payment_date', 'raw_response', 'created_at', 'updated_at')
+        read_only_fields = ('transaction_id', 'tx_ref', 'chapa_transaction_id', 'status', 
+                           'payment_date', 'checkout_url', 'created_at', 'updated_at')
 
 class PaymentInitiationSerializer(serializers.Serializer):
     booking_id = serializers.IntegerField()
@@ -0,0 +1,52 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .availability import invalidate_calendar
+from .holds import release_booking_holds
+from .models import Booking
+from .stats import record_booking_created, record_booking_deleted
+
+# Set while listings.archive moves bookings; it applies their side effects
+# once per listing instead of once per row
+_muted = contextvars.ContextVar('booking_signals_muted', default=False)
+
+@contextmanager
+def booking_signals_muted():
+    """Skip the per-booking handlers below for deletes made inside the block"""
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    """Invalidate the listing's cached availability calendar"""
+    if _muted.get():
+        return
+    invalidate_calendar(instance.listing_id)
+
+@receiver(post_save, sender=Booking)
+def booking_created(sender, instance, created, raw=False, **kwargs):
+    """Count new bookings in the listing's stats"""
+    if created and not raw:
+        record_booking_created(instance)
+
+@receiver(pre_delete, sender=Booking)
+def booking_removed(sender, instance, **kwargs):
+    """Take a deleted booking out of the listing's stats while its payment still exists"""
+    if _muted.get():
+        return
+    record_booking_deleted(instance)
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    """Free the nights a deleted booking still holds"""
+    if _muted.get():
+        return
+    transaction.on_commit(lambda: release_booking_holds(instance))
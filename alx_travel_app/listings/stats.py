@@ -0,0 +1,133 @@
+"""Incremental maintenance of ListingStats.
+
+Counters are bumped with ``UPDATE ... SET x = x + delta`` in the same
+transaction as the change they describe, so dashboards read one row per
+listing instead of aggregating bookings and payments. Deleting a booking
+takes its contribution back out; changes made outside the transitions
+(e.g. editing a status in the admin) are corrected by the nightly
+``rebuild_stats`` run.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Listing, Booking, Payment, ListingStats, BookingArchive, PaymentArchive
+
+# Booking statuses counted as confirmed stays
+CONFIRMED_STATUSES = (Booking.CONFIRMED, Booking.COMPLETED)
+STATS_FIELDS = ['bookings_count', 'confirmed_count', 'booked_nights', 'revenue', 'updated_at']
+
+def _change(field, delta):
+    if delta >= 0:
+        return F(field) + delta
+    # Counters never go below zero, even if they had drifted
+    return Greatest(F(field) + delta, Value(0), output_field=ListingStats._meta.get_field(field))
+
+def bump(listing_id, **deltas):
+    """Add ``deltas`` to a listing's counters, creating the row if needed"""
+    changes = {field: _change(field, delta) for field, delta in deltas.items()}
+    if ListingStats.objects.filter(listing_id=listing_id).update(updated_at=timezone.now(), **changes):
+        return
+    try:
+        with transaction.atomic():
+            ListingStats.objects.create(
+                listing_id=listing_id,
+                **{field: max(delta, 0) for field, delta in deltas.items()}
+            )
+    except IntegrityError:
+        # Another process created the row first
+        ListingStats.objects.filter(listing_id=listing_id).update(updated_at=timezone.now(), **changes)
+
+def record_booking_created(booking):
+    bump(booking.listing_id, bookings_count=1)
+
+def record_booking_confirmed(booking):
+    bump(
+        booking.listing_id,
+        confirmed_count=1,
+        booked_nights=(booking.check_out - booking.check_in).days
+    )
+
+def record_payment_completed(payment, listing_id):
+    bump(listing_id, revenue=payment.amount)
+
+def record_booking_deleted(booking):
+    """Remove a booking, and its completed payment, from the listing's stats.
+
+    Call it before the payment row is deleted.
+    """
+    deltas = {'bookings_count': -1}
+    if booking.status in CONFIRMED_STATUSES:
+        deltas['confirmed_count'] = -1
+        deltas['booked_nights'] = -(booking.check_out - booking.check_in).days
+    revenue = (
+        Payment.objects.filter(booking_id=booking.pk, status=Payment.COMPLETED)
+        .values_list('amount', flat=True).first()
+    )
+    if revenue:
+        deltas['revenue'] = -revenue
+    bump(booking.listing_id, **deltas)
+
+def rebuild_stats(batch_size=1000):
+    """Recompute ListingStats from live and archived rows, one listing batch at a time.
+
+    Each batch locks its stats rows while it aggregates, so incremental bumps
+    for those listings wait instead of being overwritten. Yields the number
+    of listings rebuilt so far after each batch.
+    """
+    confirmed = Q(status__in=CONFIRMED_STATUSES)
+    last_id = 0
+    rebuilt = 0
+    while True:
+        ids = list(
+            Listing.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        with transaction.atomic():
+            list(ListingStats.objects.select_for_update().filter(listing_id__in=ids).values_list('pk', flat=True))
+            totals = {listing_id: {'bookings': 0, 'confirmed': 0, 'nights': 0, 'revenue': 0} for listing_id in ids}
+            for booking_model, payment_model in ((Booking, Payment), (BookingArchive, PaymentArchive)):
+                rows = booking_model.objects.filter(listing_id__in=ids).values('listing_id').annotate(
+                    bookings=Count('id'),
+                    confirmed=Count('id', filter=confirmed),
+                    nights=Sum(
+                        ExpressionWrapper(F('check_out') - F('check_in'), output_field=DurationField()),
+                        filter=confirmed
+                    ),
+                )
+                for row in rows:
+                    total = totals[row['listing_id']]
+                    total['bookings'] += row['bookings']
+                    total['confirmed'] += row['confirmed']
+                    total['nights'] += row['nights'].days if row['nights'] else 0
+                revenue = (
+                    payment_model.objects.filter(booking__listing_id__in=ids, status=Payment.COMPLETED)
+                    .values('booking__listing_id').annotate(total=Sum('amount'))
+                    .values_list('booking__listing_id', 'total')
+                )
+                for listing_id, amount in revenue:
+                    totals[listing_id]['revenue'] += amount or 0
+
+            stats = [
+                ListingStats(
+                    listing_id=listing_id,
+                    bookings_count=total['bookings'],
+                    confirmed_count=total['confirmed'],
+                    booked_nights=total['nights'],
+                    revenue=total['revenue'],
+                )
+                for listing_id, total in totals.items()
+            ]
+            ListingStats.objects.bulk_create(
+                stats,
+                update_conflicts=True,
+                unique_fields=['listing'],
+                update_fields=STATS_FIELDS
+            )
+        rebuilt += len(stats)
+        yield rebuilt
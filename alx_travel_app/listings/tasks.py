@@ -5,23 +5,41 @@ from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.contrib.auth.models import User
 from .models import Booking, Payment
+from .locks import singleton
+from .pubsub import publish_payment_status, publish_statuses, status_message
+from . import telemetry  # noqa: F401  (registers task metric signal handlers)
+from . import profiling  # noqa: F401  (registers task profiling signal handlers)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Queue names, matching CELERY_TASK_QUEUES in settings
+PAYMENTS_QUEUE = 'payments'
+NOTIFICATIONS_QUEUE = 'notifications'
+MAINTENANCE_QUEUE = 'maintenance'
+
+# Priorities (0-9, higher runs first within a queue)
+HIGH_PRIORITY = 9
+DEFAULT_PRIORITY = 5
+LOW_PRIORITY = 2
+
 @shared_task(bind=True)
 def debug_task(self):
     """Debug task to verify Celery is working"""
     print(f'Request: {self.request!r}')
     return 'Debug task executed successfully'
 
-@shared_task
+# Emails are acked on receipt: SMTP is not idempotent, so a redelivery after a
+# worker crash would send the same email twice. They are also fire-and-forget,
+# so no TaskResult row is written for them.
+@shared_task(queue=NOTIFICATIONS_QUEUE, priority=DEFAULT_PRIORITY, acks_late=False, ignore_result=True)
 def send_booking_confirmation_email(booking_id):
     """
     Send booking confirmation email asynchronously
     """
     try:
-        booking = Booking.objects.get(id=booking_id)
+        # One query: the templates read booking.user and booking.listing
+        booking = Booking.objects.select_related('user', 'listing').get(id=booking_id)
         user = booking.user
         
         subject = f"Booking Confirmation - {booking.reference}"
@@ -57,12 +75,16 @@ def send_booking_confirmation_email(booking_id):
         logger.error(f"Failed to send booking confirmation email: {str(e)}")
         return f"Failed to send email: {str(e)}"
 
-@shared_task
+@shared_task(queue=NOTIFICATIONS_QUEUE, priority=HIGH_PRIORITY, acks_late=False, ignore_result=True)
 def send_payment_confirmation_email(user_email, booking_id, transaction_id):
     """Send payment confirmation email asynchronously"""
     try:
-        booking = Booking.objects.get(id=booking_id)
-        payment = Payment.objects.get(transaction_id=transaction_id)
+        # One query for the payment, its booking and the booked listing
+        payment = Payment.objects.select_related('booking__listing').get(
+            transaction_id=transaction_id,
+            booking_id=booking_id
+        )
+        booking = payment.booking
         
         subject = f"Payment Confirmed - Booking #{booking.reference}"
         
@@ -91,34 +113,176 @@ def send_payment_confirmation_email(user_email, booking_id, transaction_id):
         logger.info(f"Payment confirmation email sent to {user_email} for booking #{booking.reference}")
         return f"Confirmation email sent to {user_email} for booking #{booking.reference}"
         
-    except Booking.DoesNotExist:
-        logger.error(f"Booking #{booking_id} not found")
-        return f"Booking #{booking_id} not found"
     except Payment.DoesNotExist:
-        logger.error(f"Payment with transaction ID {transaction_id} not found")
+        logger.error(f"Payment with transaction ID {transaction_id} not found for booking #{booking_id}")
         return f"Payment with transaction ID {transaction_id} not found"
     except Exception as e:
         logger.error(f"Failed to send payment confirmation email: {str(e)}")
         return f"Failed to send email: {str(e)}"
 
-@shared_task
-def check_pending_payments():
-    """Check and update status of pending payments"""
+# A refund is only marked done after Chapa accepts it, so a redelivered
+# message finds the payment already refunded and stops
+@shared_task(bind=True, queue=PAYMENTS_QUEUE, priority=HIGH_PRIORITY, acks_late=True, max_retries=5)
+def refund_payment(self, payment_id, reason=''):
+    """Refund a completed payment through Chapa and mark it refunded.
+
+    Used when a late payment arrives for nights another booking has taken.
+    Network errors and 5xx responses are retried; other rejections are
+    logged for manual follow-up.
+    """
+    from . import chapa
+    from .models import PaymentEvent
+    from .transitions import transition
+    
+    payment = Payment.objects.filter(id=payment_id, status=Payment.COMPLETED).first()
+    if payment is None:
+        return {'refunded': False}
+    
+    try:
+        status_code, response_data = chapa.refund(payment.tx_ref or payment.chapa_transaction_id, reason)
+    except chapa.ChapaError as e:
+        raise self.retry(exc=e, countdown=60)
+    if status_code >= 500:
+        raise self.retry(countdown=60)
+    
+    PaymentEvent.record(payment, PaymentEvent.REFUND, response_data)
+    if status_code != 200 or response_data.get('status') != 'success':
+        logger.error(f"Chapa refused refund of payment #{payment_id}: {response_data}")
+        return {'refunded': False}
+    
+    if transition(payment, [Payment.COMPLETED], Payment.REFUNDED):
+        publish_payment_status(payment)
+    logger.info(f"Refunded payment #{payment_id}")
+    return {'refunded': True}
+
+# Maintenance is idempotent, so it is acked late and redelivered if a worker dies
+@shared_task(queue=MAINTENANCE_QUEUE, priority=LOW_PRIORITY, acks_late=True)
+@singleton('check-pending-payments', ttl=60)
+def check_pending_payments(batch_size=1000):
+    """Mark payments pending for more than 30 minutes as failed, in batches.
+
+    Each batch is verified with Chapa first, so payments that were made but
+    never reported are completed instead of expired. Payments older than
+    PAYMENT_RECONCILE_MAX_AGE are expired without another lookup; a late
+    webhook can still complete them.
+    """
     from django.utils import timezone
     from datetime import timedelta
+    from .reconcile import reconcile_payments
     
     # Find payments pending for more than 30 minutes
     time_threshold = timezone.now() - timedelta(minutes=30)
-    pending_payments = Payment.objects.filter(
+    lookup_cutoff = timezone.now() - timedelta(seconds=settings.PAYMENT_RECONCILE_MAX_AGE)
+    expired = Payment.objects.select_related('booking__user').filter(
         status=Payment.PENDING,
         created_at__lt=time_threshold
-    )
+    ).order_by('id')
     
-    updated_count = 0
-    for payment in pending_payments:
-        payment.status = Payment.FAILED
-        payment.save()
-        updated_count += 1
+    # Short conditional updates keep row locks brief and skip rows that a
+    # webhook or verify call completed in the meantime
+    updated_count = completed_count = 0
+    last_id = 0
+    while True:
+        batch = list(expired.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        
+        # Only payments Chapa answered for are expired; the rest wait for the
+        # next run until they are too old to look up
+        stale = [payment.id for payment in batch if payment.created_at < lookup_cutoff]
+        outcome = reconcile_payments([p for p in batch if p.created_at >= lookup_cutoff], record_unpaid=True)
+        completed_count += len(outcome['completed'])
+        ids = outcome['unpaid'] + stale
+        if not ids:
+            continue
+        now = timezone.now()
+        updated_count += Payment.objects.filter(id__in=ids, status=Payment.PENDING).update(
+            status=Payment.FAILED,
+            updated_at=now
+        )
         
-    logger.info(f"Updated {updated_count} expired payments")
-    return f"Updated {pending_payments.count()} expired payments"
\ No newline at end of file
+        # Tell clients streaming these payments; rows another process moved
+        # in the meantime carry a different timestamp and are left out
+        publish_statuses([
+            status_message(transaction_id, Payment.FAILED, now)
+            for transaction_id in Payment.objects.filter(
+                id__in=ids, status=Payment.FAILED, updated_at=now
+            ).values_list('transaction_id', flat=True)
+        ])
+        
+    logger.info(f"Updated {updated_count} expired payments, completed {completed_count} paid ones")
+    return {'expired': updated_count, 'completed': completed_count}
+
+# Reconciliation is idempotent too, and runs with payment work rather than
+# behind other maintenance
+@shared_task(queue=PAYMENTS_QUEUE, priority=DEFAULT_PRIORITY, acks_late=True)
+@singleton('reconcile-pending-payments', ttl=120)
+def reconcile_pending_payments(chunk_size=500):
+    """Verify pending payments with Chapa and complete the ones that were paid.
+
+    Covers payments older than PAYMENT_RECONCILE_AFTER seconds, giving the
+    webhook time to arrive first, with lookups of each payment backed off
+    and stopped after PAYMENT_RECONCILE_MAX_AGE. Unpaid payments stay
+    pending until check_pending_payments expires them.
+    """
+    from .reconcile import due_for_verification, reconcile_payments
+    
+    pending = due_for_verification().select_related('booking__user').order_by('id')
+    
+    totals = {'completed': 0, 'unpaid': 0, 'errors': 0}
+    last_id = 0
+    while True:
+        chunk = list(pending.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        for name, ids in reconcile_payments(chunk).items():
+            totals[name] += len(ids)
+    
+    logger.info(f"Reconciled pending payments: {totals}")
+    return totals
+
+@shared_task(queue=MAINTENANCE_QUEUE, priority=LOW_PRIORITY, acks_late=True)
+@singleton('archive-records', ttl=120)
+def archive_old_records():
+    """Complete ended stays, then move finished bookings and their payments to the archive tables"""
+    from .archive import archive_records
+    from .transitions import complete_past_stays
+    
+    completed = complete_past_stays(settings.ARCHIVE_BATCH_SIZE)
+    archived = archive_records(settings.ARCHIVE_AFTER_DAYS, settings.ARCHIVE_BATCH_SIZE)
+    return {'completed': completed, 'archived': archived}
+
+@shared_task(queue=MAINTENANCE_QUEUE, priority=LOW_PRIORITY, acks_late=True)
+@singleton('rebuild-listing-stats', ttl=120)
+def rebuild_listing_stats(batch_size=1000):
+    """Recompute ListingStats, correcting drift from changes made outside the transitions"""
+    from .stats import rebuild_stats
+    
+    rebuilt = 0
+    for rebuilt in rebuild_stats(batch_size):
+        pass
+    logger.info(f"Rebuilt stats for {rebuilt} listings")
+    return {'rebuilt': rebuilt}
+
+@shared_task(queue=MAINTENANCE_QUEUE, priority=LOW_PRIORITY, acks_late=True)
+@singleton('purge-task-results', ttl=120)
+def purge_task_results(batch_size=5000):
+    """Delete stored task results older than TASK_RESULT_TTL, in batches"""
+    from django.utils import timezone
+    from django_celery_results.models import TaskResult
+    
+    cutoff = timezone.now() - settings.TASK_RESULT_TTL
+    expired = TaskResult.objects.filter(date_done__lt=cutoff)
+    
+    # Small deletes avoid one long transaction over the whole results table
+    deleted_count = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted_count += TaskResult.objects.filter(id__in=ids).delete()[0]
+    
+    logger.info(f"Purged {deleted_count} task results")
+    return {'deleted': deleted_count}
\ No newline at end of file
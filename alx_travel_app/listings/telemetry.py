@@ -0,0 +1,54 @@
+"""Celery signal handlers that record task metrics.
+
+Wait time is measured from publish to start using an ``enqueued_at`` header
+stamped by the producer, so publisher and worker clocks should be in sync.
+"""
+import time
+
+from celery.signals import (
+    before_task_publish,
+    task_prerun,
+    task_postrun,
+    task_retry,
+    worker_process_shutdown,
+)
+
+from .metrics import registry
+
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_started = {}
+
+@before_task_publish.connect
+def stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers['enqueued_at'] = time.time()
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.perf_counter()
+    enqueued_at = task.request.get('enqueued_at')
+    if enqueued_at and not task.request.is_eager:
+        delivery_info = task.request.delivery_info or {}
+        registry.observe(
+            'celery_task_queue_wait_seconds',
+            max(time.time() - enqueued_at, 0),
+            {'task': task.name, 'queue': delivery_info.get('routing_key') or 'unknown'},
+            buckets=QUEUE_WAIT_BUCKETS
+        )
+
+@task_postrun.connect
+def record_task_end(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        registry.observe('celery_task_runtime_seconds', time.perf_counter() - started, {'task': task.name})
+    registry.inc('celery_tasks_total', {'task': task.name, 'state': state or 'UNKNOWN'})
+    registry.maybe_flush()
+
+@task_retry.connect
+def record_task_retry(sender=None, **kwargs):
+    registry.inc('celery_task_retries_total', {'task': sender.name})
+
+@worker_process_shutdown.connect
+def flush_on_shutdown(**kwargs):
+    registry.flush()
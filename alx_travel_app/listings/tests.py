@@ -0,0 +1,633 @@
+from datetime import date
+from types import SimpleNamespace
+from unittest import mock
+from decimal import Decimal
+
+import fakeredis
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import chapa, holds, throttling
+from .archive import archive_records
+from .models import (
+    Booking, Listing, ListingStats, Payment, PaymentEvent, SeasonalRate, LengthOfStayDiscount,
+    BookingArchive, PaymentArchive, PaymentEventArchive
+)
+from .pricing import quote_listings, quote_stay
+from .serializers import BookingSerializer
+from .stats import rebuild_stats
+from .transitions import complete_payment
+from .views import BookingViewSet
+from .tasks import send_booking_confirmation_email, send_payment_confirmation_email
+
+LOCMEM_SETTINGS = {
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+}
+
+@override_settings(**LOCMEM_SETTINGS)
+class EmailTaskQueryTests(TestCase):
+    """Each email task loads everything its templates need in one query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'pw', first_name='Ada')
+        cls.listing = Listing.objects.create(
+            title='Lake House',
+            description='By the lake',
+            price_per_night=Decimal('100.00'),
+            location='Bishoftu',
+            bedrooms=2,
+            bathrooms=1,
+            max_guests=4
+        )
+        cls.booking = Booking.objects.create(
+            user=cls.user,
+            listing=cls.listing,
+            check_in=date(2030, 1, 1),
+            check_out=date(2030, 1, 3),
+            number_of_guests=2,
+            total_price=Decimal('200.00'),
+            status=Booking.CONFIRMED
+        )
+        cls.payment = Payment.objects.create(
+            booking=cls.booking,
+            amount=cls.booking.total_price,
+            status=Payment.COMPLETED
+        )
+
+    def test_booking_confirmation_email_uses_one_query(self):
+        with self.assertNumQueries(1):
+            send_booking_confirmation_email(self.booking.id)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['guest@example.com'])
+        self.assertIn(self.booking.reference, mail.outbox[0].subject)
+        self.assertIn('Lake House', mail.outbox[0].body)
+
+    def test_payment_confirmation_email_uses_one_query(self):
+        with self.assertNumQueries(1):
+            send_payment_confirmation_email('guest@example.com', self.booking.id, self.payment.transaction_id)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['guest@example.com'])
+        self.assertIn(self.booking.reference, mail.outbox[0].subject)
+        self.assertIn(self.payment.transaction_id, mail.outbox[0].body)
+        self.assertIn('Lake House', mail.outbox[0].body)
+
+    def test_missing_booking_sends_nothing(self):
+        with self.assertNumQueries(1):
+            send_booking_confirmation_email(0)
+
+        self.assertEqual(mail.outbox, [])
+
+@override_settings(BOOKING_HOLD_BACKEND='memory', BOOKING_HOLD_TTL=600)
+class InMemoryHoldStoreTests(TestCase):
+    """Checkout holds turn away other guests without touching earlier holds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'pw')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pw')
+        cls.listing = Listing.objects.create(
+            title='Lake House',
+            description='By the lake',
+            price_per_night=Decimal('100.00'),
+            location='Bishoftu',
+            bedrooms=2,
+            bathrooms=1,
+            max_guests=4
+        )
+
+    def setUp(self):
+        holds._store = None
+        self.addCleanup(setattr, holds, '_store', None)
+        self.store = holds.get_hold_store()
+
+    def validate(self, user, check_in, check_out):
+        serializer = BookingSerializer(
+            data={
+                'listing': self.listing.id,
+                'check_in': check_in,
+                'check_out': check_out,
+                'number_of_guests': 2
+            },
+            context={'request': SimpleNamespace(user=user)}
+        )
+        return serializer.is_valid(), serializer.errors
+
+    def test_store_follows_backend_setting(self):
+        self.assertIsInstance(self.store, holds.InMemoryHoldStore)
+
+    def test_second_user_refused_while_hold_is_live(self):
+        valid, _ = self.validate(self.guest, date(2030, 2, 1), date(2030, 2, 4))
+        self.assertTrue(valid)
+
+        valid, errors = self.validate(self.other, date(2030, 2, 3), date(2030, 2, 5))
+        self.assertFalse(valid)
+        self.assertIn('being booked by another guest', str(errors))
+
+    def test_retry_keeps_earlier_hold(self):
+        first = self.store.acquire(self.listing.id, date(2030, 2, 1), date(2030, 2, 3), self.guest.id, 600)
+        self.assertEqual(first, [date(2030, 2, 1), date(2030, 2, 2)])
+
+        retry = self.store.acquire(self.listing.id, date(2030, 2, 2), date(2030, 2, 4), self.guest.id, 600)
+        self.assertEqual(retry, [date(2030, 2, 3)])
+        self.store.release_nights(self.listing.id, retry, self.guest.id)
+
+        self.assertIsNone(
+            self.store.acquire(self.listing.id, date(2030, 2, 1), date(2030, 2, 3), self.other.id, 600)
+        )
+        self.assertEqual(
+            self.store.acquire(self.listing.id, date(2030, 2, 3), date(2030, 2, 4), self.other.id, 600),
+            [date(2030, 2, 3)]
+        )
+
+    def test_hold_expires_after_ttl(self):
+        with mock.patch('listings.holds.time.monotonic', return_value=1000.0):
+            self.store.acquire(self.listing.id, date(2030, 2, 1), date(2030, 2, 3), self.guest.id, 60)
+        with mock.patch('listings.holds.time.monotonic', return_value=1059.0):
+            self.assertIsNone(
+                self.store.acquire(self.listing.id, date(2030, 2, 1), date(2030, 2, 3), self.other.id, 60)
+            )
+        with mock.patch('listings.holds.time.monotonic', return_value=1061.0):
+            self.assertEqual(
+                self.store.acquire(self.listing.id, date(2030, 2, 1), date(2030, 2, 3), self.other.id, 60),
+                [date(2030, 2, 1), date(2030, 2, 2)]
+            )
+
+    def test_overlap_failure_releases_only_fresh_nights(self):
+        Booking.objects.create(
+            user=self.other,
+            listing=self.listing,
+            check_in=date(2030, 2, 1),
+            check_out=date(2030, 2, 3),
+            number_of_guests=2,
+            total_price=Decimal('200.00'),
+            status=Booking.CONFIRMED
+        )
+        # The guest already holds the 3rd for an earlier checkout
+        self.store.acquire(self.listing.id, date(2030, 2, 3), date(2030, 2, 4), self.guest.id, 600)
+
+        valid, errors = self.validate(self.guest, date(2030, 2, 2), date(2030, 2, 4))
+        self.assertFalse(valid)
+        self.assertIn('not available', str(errors))
+
+        self.assertIsNone(
+            self.store.acquire(self.listing.id, date(2030, 2, 3), date(2030, 2, 4), self.other.id, 600)
+        )
+        self.assertEqual(
+            self.store.acquire(self.listing.id, date(2030, 2, 2), date(2030, 2, 3), self.other.id, 600),
+            [date(2030, 2, 2)]
+        )
+
+@override_settings(**LOCMEM_SETTINGS)
+class CompletePaymentTests(TestCase):
+    """Completing a payment runs its side effects once, or refunds a lost stay"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'pw')
+        cls.listing = Listing.objects.create(
+            title='Lake House',
+            description='By the lake',
+            price_per_night=Decimal('100.00'),
+            location='Bishoftu',
+            bedrooms=2,
+            bathrooms=1,
+            max_guests=4
+        )
+        cls.booking = Booking.objects.create(
+            user=cls.user,
+            listing=cls.listing,
+            check_in=date(2030, 3, 1),
+            check_out=date(2030, 3, 3),
+            number_of_guests=2,
+            total_price=Decimal('200.00')
+        )
+
+    def setUp(self):
+        self.publish = self.patch('listings.transitions.publish_payment_status')
+        self.send_email = self.patch('listings.transitions.send_payment_confirmation_email.delay')
+        self.refund = self.patch('listings.transitions.refund_payment.delay')
+
+    def patch(self, target):
+        patcher = mock.patch(target)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def load_payment(self, **fields):
+        payment = Payment.objects.create(booking=self.booking, amount=self.booking.total_price, **fields)
+        return Payment.objects.select_related('booking__user').get(pk=payment.pk)
+
+    def test_second_completion_does_nothing(self):
+        payment = self.load_payment()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertTrue(complete_payment(payment, 'telebirr'))
+        first_callbacks = len(callbacks)
+
+        duplicate = Payment.objects.select_related('booking__user').get(pk=payment.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertFalse(complete_payment(duplicate, 'telebirr'))
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(first_callbacks, 3)
+        self.send_email.assert_called_once_with(
+            user_email='guest@example.com',
+            booking_id=self.booking.id,
+            transaction_id=payment.transaction_id
+        )
+        self.publish.assert_called_once()
+        payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(payment.status, Payment.COMPLETED)
+        self.assertEqual(payment.payment_method, 'telebirr')
+        self.assertEqual(self.booking.status, Booking.CONFIRMED)
+
+    def test_failed_payment_can_complete(self):
+        payment = self.load_payment(status=Payment.FAILED)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(complete_payment(payment))
+
+        payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(payment.status, Payment.COMPLETED)
+        self.assertEqual(self.booking.status, Booking.CONFIRMED)
+        self.send_email.assert_called_once()
+
+    def test_taken_nights_cancel_booking_and_refund(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        Booking.objects.create(
+            user=other,
+            listing=self.listing,
+            check_in=date(2030, 3, 2),
+            check_out=date(2030, 3, 4),
+            number_of_guests=2,
+            total_price=Decimal('200.00'),
+            status=Booking.CONFIRMED
+        )
+        payment = self.load_payment()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(complete_payment(payment))
+
+        payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(payment.status, Payment.COMPLETED)
+        self.assertEqual(self.booking.status, Booking.CANCELLED)
+        self.refund.assert_called_once_with(
+            payment.id,
+            f'Nights of booking #{self.booking.reference} were booked by another guest'
+        )
+        self.send_email.assert_not_called()
+        self.publish.assert_called_once()
+
+@override_settings(BOOKING_HOLD_BACKEND='memory', THROTTLE_BACKEND='memory', **LOCMEM_SETTINGS)
+class IdempotencyKeyTests(TestCase):
+    """Retries with the same Idempotency-Key replay the first response"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'pw')
+        cls.listing = Listing.objects.create(
+            title='Lake House',
+            description='By the lake',
+            price_per_night=Decimal('100.00'),
+            location='Bishoftu',
+            bedrooms=2,
+            bathrooms=1,
+            max_guests=4
+        )
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        for target, value in [
+            ('listings.connections._redis_client', fakeredis.FakeRedis(server=self.server)),
+            ('listings.holds._store', None),
+            ('listings.throttling._bucket', None),
+        ]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('listings.views.send_booking_confirmation_email.delay')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, key, check_out='2030-04-03'):
+        return self.client.post('/api/bookings/', {
+            'listing': self.listing.id,
+            'check_in': '2030-04-01',
+            'check_out': check_out,
+            'number_of_guests': 2
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        first = self.book('key-1')
+        retry = self.book('key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_different_payload_is_rejected(self):
+        self.book('key-1')
+        response = self.book('key-1', check_out='2030-04-05')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_key_in_flight_conflicts(self):
+        concurrent = []
+        create = BookingViewSet.perform_create
+
+        def perform_create(view, serializer):
+            concurrent.append(self.book('key-1'))
+            return create(view, serializer)
+
+        with mock.patch.object(BookingViewSet, 'perform_create', perform_create):
+            first = self.book('key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(concurrent[0].status_code, 409)
+        self.assertEqual(concurrent[0]['Retry-After'], '1')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_validation_error_is_replayed(self):
+        first = self.book('key-1', check_out='2030-04-01')
+        retry = self.book('key-1', check_out='2030-04-01')
+
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(retry.status_code, 400)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+
+    def test_server_error_releases_key(self):
+        booking = Booking.objects.create(
+            user=self.user,
+            listing=self.listing,
+            check_in=date(2030, 4, 1),
+            check_out=date(2030, 4, 3),
+            number_of_guests=2,
+            total_price=Decimal('200.00')
+        )
+        with mock.patch.object(chapa, 'initialize', side_effect=chapa.ChapaError('timed out')) as initialize:
+            for _ in range(2):
+                response = self.client.post(
+                    '/api/payments/initiate/', {'booking_id': booking.id}, format='json', HTTP_IDEMPOTENCY_KEY='key-1'
+                )
+                self.assertEqual(response.status_code, 503)
+                self.assertNotIn('Idempotent-Replayed', response)
+
+        self.assertEqual(initialize.call_count, 2)
+
+    def test_runs_unprotected_while_redis_is_down(self):
+        self.server.connected = False
+        with self.assertLogs('listings.idempotency', 'WARNING'):
+            response = self.book('key-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Booking.objects.count(), 1)
+
+class TokenBucketTests(TestCase):
+    """Buckets refill with time and fall back to process memory without Redis"""
+
+    def consume_at(self, bucket, now, key='throttle:user:1'):
+        with mock.patch('listings.throttling.time.time', return_value=now), \
+                mock.patch('listings.throttling.time.monotonic', return_value=now):
+            return bucket.consume(key, rate=2, capacity=3)
+
+    def assert_refills(self, bucket):
+        for _ in range(3):
+            self.assertEqual(self.consume_at(bucket, 1000.0), (True, 0.0))
+        self.assertEqual(self.consume_at(bucket, 1000.0), (False, 0.5))
+        self.assertEqual(self.consume_at(bucket, 1000.25), (False, 0.25))
+        self.assertEqual(self.consume_at(bucket, 1000.5), (True, 0.0))
+        self.assertEqual(self.consume_at(bucket, 1000.5), (False, 0.5))
+        # Other callers have their own bucket
+        self.assertEqual(self.consume_at(bucket, 1000.5, key='throttle:user:2'), (True, 0.0))
+
+    def test_redis_bucket_refills_and_refuses(self):
+        self.assert_refills(throttling.RedisTokenBucket(fakeredis.FakeRedis()))
+
+    def test_memory_bucket_refills_and_refuses(self):
+        self.assert_refills(throttling.InMemoryTokenBucket())
+
+    def test_falls_back_to_memory_while_redis_is_down(self):
+        server = fakeredis.FakeServer()
+        server.connected = False
+        bucket = throttling.RedisTokenBucket(fakeredis.FakeRedis(server=server))
+        with self.assertLogs('listings.throttling', 'WARNING') as logs:
+            self.assert_refills(bucket)
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertTrue(bucket._degraded)
+
+@override_settings(SHED_DB_LATENCY_MS=100, SHED_RETRY_AFTER=7, SHED_RECOVERY_SECONDS=10, **LOCMEM_SETTINGS)
+class LoadSheddingTests(TestCase):
+    """Browse traffic is shed with 503 while database latency stays high"""
+
+    def setUp(self):
+        self.monitor = throttling.DatabaseLoadMonitor()
+        patcher = mock.patch('listings.throttling.db_load', self.monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_shedding_has_hysteresis(self):
+        # A 1000ms sample lifts the smoothed latency to 100ms, then 190ms
+        self.monitor.observe(1.0, 1)
+        self.assertFalse(self.monitor.overloaded())
+        self.monitor.observe(1.0, 1)
+        self.assertTrue(self.monitor.overloaded())
+
+        # Fast queries decay it by 10% each; shedding holds down to 70ms
+        while self.monitor.latency_ms >= 70:
+            self.assertTrue(self.monitor.overloaded())
+            self.monitor.observe(0.0, 1)
+        self.assertFalse(self.monitor.overloaded())
+
+    def test_shedding_ends_without_new_samples(self):
+        with mock.patch('listings.throttling.time.monotonic', return_value=1000.0):
+            self.monitor.observe(2.0, 1)
+            self.assertTrue(self.monitor.overloaded())
+        with mock.patch('listings.throttling.time.monotonic', return_value=1011.0):
+            self.assertFalse(self.monitor.overloaded())
+
+    def test_overloaded_browse_gets_503_with_retry_after(self):
+        self.monitor.observe(2.0, 1)
+        response = APIClient().get('/api/listings/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+@override_settings(THROTTLE_BACKEND='memory', **LOCMEM_SETTINGS)
+class ArchiveTests(TestCase):
+    """Archived bookings leave the live tables but stay readable and counted"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'pw')
+        cls.listing = Listing.objects.create(
+            title='Lake House',
+            description='By the lake',
+            price_per_night=Decimal('100.00'),
+            location='Bishoftu',
+            bedrooms=2,
+            bathrooms=1,
+            max_guests=4
+        )
+        cls.booking = Booking.objects.create(
+            user=cls.user,
+            listing=cls.listing,
+            check_in=date(2020, 1, 1),
+            check_out=date(2020, 1, 3),
+            number_of_guests=2,
+            total_price=Decimal('200.00'),
+            status=Booking.COMPLETED
+        )
+        cls.payment = Payment.objects.create(
+            booking=cls.booking,
+            amount=cls.booking.total_price,
+            status=Payment.COMPLETED
+        )
+        PaymentEvent.objects.create(
+            payment=cls.payment,
+            source=PaymentEvent.WEBHOOK,
+            payload=PaymentEvent.compress({'status': 'success'})
+        )
+        list(rebuild_stats())
+
+    def setUp(self):
+        patcher = mock.patch('listings.throttling._bucket', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_stats(self):
+        stats = ListingStats.objects.get(listing=self.listing)
+        self.assertEqual(stats.bookings_count, 1)
+        self.assertEqual(stats.confirmed_count, 1)
+        self.assertEqual(stats.booked_nights, 2)
+        self.assertEqual(stats.revenue, Decimal('200.00'))
+
+    def test_archived_booking_is_moved_and_still_readable(self):
+        self.assertEqual(archive_records(older_than_days=30), 1)
+
+        self.assertFalse(Booking.objects.filter(pk=self.booking.pk).exists())
+        self.assertFalse(Payment.objects.filter(pk=self.payment.pk).exists())
+        self.assertFalse(PaymentEvent.objects.filter(payment_id=self.payment.pk).exists())
+        self.assertTrue(BookingArchive.objects.filter(pk=self.booking.pk, reference=self.booking.reference).exists())
+        self.assertTrue(PaymentArchive.objects.filter(pk=self.payment.pk, booking_id=self.booking.pk).exists())
+        self.assertEqual(PaymentEventArchive.objects.filter(payment_id=self.payment.pk).count(), 1)
+
+        response = self.client.get(f'/api/bookings/{self.booking.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reference'], self.booking.reference)
+
+        response = self.client.get('/api/bookings/', {'archived': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.booking.reference, str(response.json()))
+        self.assertNotIn(self.booking.reference, str(self.client.get('/api/bookings/').json()))
+
+        response = self.client.get(f'/api/bookings/reference/{self.booking.reference}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.booking.pk)
+
+        response = self.client.get(f'/api/payments/status/{self.payment.transaction_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], Payment.COMPLETED)
+        self.assertEqual(response.json()['booking_reference'], self.booking.reference)
+
+    def test_archived_rows_still_count_towards_stats(self):
+        archive_records(older_than_days=30)
+        self.assert_stats()
+
+        ListingStats.objects.all().delete()
+        list(rebuild_stats())
+        self.assert_stats()
+
+class PricingTests(TestCase):
+    """Quotes match totals worked out by hand"""
+
+    def make_listing(self, price, uplift='0', **fields):
+        return Listing.objects.create(
+            title='Lake House',
+            description='By the lake',
+            price_per_night=Decimal(price),
+            weekend_uplift_percent=Decimal(uplift),
+            location='Bishoftu',
+            bedrooms=2,
+            bathrooms=1,
+            max_guests=4,
+            **fields
+        )
+
+    def test_seasonal_rate_and_stay_discount(self):
+        listing = self.make_listing('100.00')
+        SeasonalRate.objects.create(
+            listing=listing, start_date=date(2030, 1, 1), end_date=date(2030, 2, 1), price_per_night=Decimal('150.00')
+        )
+        LengthOfStayDiscount.objects.create(listing=listing, min_nights=3, discount_percent=Decimal('10.00'))
+
+        # Sun 30 Dec to Thu 3 Jan: 100 + 100 + 150 + 150 = 500, less 10%
+        quote = quote_listings([listing.id], date(2029, 12, 30), date(2030, 1, 3))[listing.id]
+        self.assertEqual(quote['total'], Decimal('450.00'))
+        self.assertEqual(quote['average_nightly'], Decimal('112.50'))
+        self.assertEqual(quote['discount_percent'], Decimal('10.00'))
+
+    def test_latest_starting_seasonal_rate_wins(self):
+        listing = self.make_listing('100.00')
+        SeasonalRate.objects.create(
+            listing=listing, start_date=date(2030, 1, 3), end_date=date(2030, 1, 5), price_per_night=Decimal('200.00')
+        )
+        SeasonalRate.objects.create(
+            listing=listing, start_date=date(2030, 1, 1), end_date=date(2030, 1, 10), price_per_night=Decimal('150.00')
+        )
+
+        # Tue and Wed at 150, Thu at the later-starting 200
+        self.assertEqual(quote_stay(listing, date(2030, 1, 1), date(2030, 1, 4)), Decimal('500.00'))
+
+        # Of two rates starting the same day, the newest wins
+        SeasonalRate.objects.create(
+            listing=listing, start_date=date(2030, 1, 3), end_date=date(2030, 1, 4), price_per_night=Decimal('300.00')
+        )
+        self.assertEqual(quote_stay(listing, date(2030, 1, 1), date(2030, 1, 4)), Decimal('600.00'))
+
+    def test_weekend_uplift_on_friday_and_saturday(self):
+        listing = self.make_listing('100.00', uplift='12.50')
+
+        # Thu 100, Fri 112.50, Sat 112.50
+        self.assertEqual(quote_stay(listing, date(2030, 1, 3), date(2030, 1, 6)), Decimal('325.00'))
+
+    def test_best_stay_discount_applies(self):
+        listing = self.make_listing('100.00')
+        for min_nights, percent in [(2, '5.00'), (3, '15.00'), (7, '30.00')]:
+            LengthOfStayDiscount.objects.create(listing=listing, min_nights=min_nights, discount_percent=Decimal(percent))
+
+        # Mon to Fri: four weekday nights of 100, less 15%
+        quote = quote_listings([listing.id], date(2030, 1, 7), date(2030, 1, 11))[listing.id]
+        self.assertEqual(quote['total'], Decimal('340.00'))
+        self.assertEqual(quote['discount_percent'], Decimal('15.00'))
+
+    def test_rounds_half_up_to_the_cent(self):
+        uplifted = self.make_listing('99.99', uplift='12.50')
+        discounted = self.make_listing('10.05')
+        LengthOfStayDiscount.objects.create(listing=discounted, min_nights=1, discount_percent=Decimal('50.00'))
+
+        # 99.99 * 1.125 = 112.48875 and 10.05 * 0.5 = 5.025
+        self.assertEqual(quote_stay(uplifted, date(2030, 1, 4), date(2030, 1, 5)), Decimal('112.49'))
+        self.assertEqual(quote_stay(discounted, date(2030, 1, 7), date(2030, 1, 8)), Decimal('5.03'))
+
+    def test_unavailable_listings_are_left_out(self):
+        available = self.make_listing('100.00')
+        unavailable = self.make_listing('100.00', is_available=False)
+
+        quotes = quote_listings([available.id, unavailable.id, 0], date(2030, 1, 7), date(2030, 1, 9))
+        self.assertEqual(list(quotes), [available.id])
+        self.assertEqual(quotes[available.id]['total'], Decimal('200.00'))
@@ -0,0 +1,199 @@
+"""Token-bucket throttling and load shedding for the API.
+
+Each scope has a budget in THROTTLE_BUDGETS of ``(tokens per second, burst)``.
+Buckets live in Redis and are updated by one atomic script, so every web
+process draws from the same budget; if Redis is unreachable, each process
+falls back to its own in-memory buckets rather than failing requests.
+
+Separately, the metrics middleware feeds a smoothed per-query database
+latency into ``db_load``. While it is above SHED_DB_LATENCY_MS, views that
+use LoadSheddingThrottle (listing browse traffic) are refused with 503, so
+the database capacity that remains goes to checkout and payments.
+"""
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from .connections import get_redis
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Refill by elapsed time, then take ``cost`` tokens if there are enough.
+# Returns {allowed, seconds until enough tokens} (as a string, since Redis
+# truncates Lua numbers to integers)
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('pexpire', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+class InMemoryTokenBucket:
+    """Process-local token buckets, for development and as the Redis fallback"""
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def consume(self, key, rate, capacity, cost=1):
+        """Take ``cost`` tokens; returns ``(allowed, seconds to wait)``"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) >= self.MAX_BUCKETS:
+                self._prune(now)
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    def _prune(self, now):
+        # Buckets idle for a minute are full again and can be dropped
+        for key in [k for k, (_, ts) in self._buckets.items() if now - ts > 60]:
+            del self._buckets[key]
+
+class RedisTokenBucket:
+    """Token buckets shared by all processes through Redis"""
+
+    def __init__(self, client=None):
+        self.client = client
+        self.fallback = InMemoryTokenBucket()
+        self._degraded = False
+
+    def consume(self, key, rate, capacity, cost=1):
+        """Take ``cost`` tokens; returns ``(allowed, seconds to wait)``"""
+        try:
+            allowed, wait = (self.client or get_redis()).eval(
+                TOKEN_BUCKET_SCRIPT, 1, key, rate, capacity, repr(time.time()), cost
+            )
+        except redis.RedisError as e:
+            if not self._degraded:
+                logger.warning(f"Throttling falls back to per-process buckets: {e}")
+                self._degraded = True
+            return self.fallback.consume(key, rate, capacity, cost)
+        self._degraded = False
+        return bool(allowed), float(wait)
+
+_bucket = None
+
+def get_token_bucket():
+    """Return the configured bucket store (THROTTLE_BACKEND: redis or memory)"""
+    global _bucket
+    if _bucket is None:
+        if settings.THROTTLE_BACKEND == 'memory':
+            _bucket = InMemoryTokenBucket()
+        else:
+            _bucket = RedisTokenBucket()
+    return _bucket
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle against the THROTTLE_BUDGETS entry for ``scope``.
+
+    Authenticated callers get a bucket per user, anonymous ones per IP.
+    """
+    scope = None
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        rate, burst = settings.THROTTLE_BUDGETS[self.scope]
+        key = f"throttle:{self.scope}:{self.get_ident_key(request)}"
+        allowed, self._wait = get_token_bucket().consume(key, rate, burst)
+        if not allowed:
+            registry.inc('http_requests_throttled_total', {'scope': self.scope})
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+class UserThrottle(TokenBucketThrottle):
+    """Default budget for API calls"""
+    scope = 'user'
+
+class BrowseThrottle(TokenBucketThrottle):
+    """Budget for public listing traffic"""
+    scope = 'browse'
+
+class WebhookThrottle(TokenBucketThrottle):
+    """Budget for gateway callbacks, always per source IP"""
+    scope = 'webhook'
+
+    def get_ident_key(self, request):
+        return f"ip:{self.get_ident(request)}"
+
+class DatabaseLoadMonitor:
+    """Exponentially smoothed database latency per query, in milliseconds.
+
+    Overload starts above SHED_DB_LATENCY_MS and ends below 70% of it, so
+    shedding does not flap around the threshold. Without new observations
+    for SHED_RECOVERY_SECONDS the database is assumed to have recovered.
+    """
+
+    ALPHA = 0.1
+
+    def __init__(self):
+        self.latency_ms = 0.0
+        self.shedding = False
+        self._updated = 0.0
+
+    def observe(self, query_seconds, queries):
+        """Record one request's database time"""
+        sample = query_seconds / queries * 1000
+        self.latency_ms += self.ALPHA * (sample - self.latency_ms)
+        self._updated = time.monotonic()
+        threshold = settings.SHED_DB_LATENCY_MS
+        if self.latency_ms > threshold:
+            self.shedding = True
+        elif self.latency_ms < threshold * 0.7:
+            self.shedding = False
+
+    def overloaded(self):
+        if self.shedding and time.monotonic() - self._updated > settings.SHED_RECOVERY_SECONDS:
+            self.shedding = False
+            self.latency_ms = 0.0
+        return self.shedding
+
+db_load = DatabaseLoadMonitor()
+
+class Overloaded(Throttled):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Service is under heavy load, please retry shortly.'
+
+class LoadSheddingThrottle(BaseThrottle):
+    """Refuse the view's requests with 503 while the database is overloaded"""
+
+    def allow_request(self, request, view):
+        if settings.SHED_DB_LATENCY_MS > 0 and db_load.overloaded():
+            match = request.resolver_match
+            registry.inc('http_requests_shed_total', {'view': match.view_name if match else 'unmatched'})
+            raise Overloaded(wait=settings.SHED_RETRY_AFTER)
+        return True
@@ -0,0 +1,121 @@
+"""Conditional status transitions for bookings and payments.
+
+Each transition is one ``UPDATE ... WHERE status IN (<expected>)`` that writes
+only the changed columns. When a webhook and a verify call race, exactly one
+of them wins the transition, and only the winner runs side effects, including
+publishing the new payment status to clients streaming it.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import invalidate_calendar
+from .holds import release_booking_holds
+from .models import Booking, Listing, Payment
+from .pubsub import publish_payment_status
+from .stats import record_booking_confirmed, record_payment_completed
+from .tasks import refund_payment, send_payment_confirmation_email
+
+def transition(instance, from_statuses, to_status, **changes):
+    """Move ``instance`` to ``to_status`` if it is still in ``from_statuses``.
+
+    Returns True if this call made the change; the instance is updated in
+    memory only in that case.
+    """
+    now = timezone.now()
+    updated = type(instance).objects.filter(
+        pk=instance.pk,
+        status__in=from_statuses
+    ).update(status=to_status, updated_at=now, **changes)
+    if updated:
+        instance.status = to_status
+        instance.updated_at = now
+        for field, value in changes.items():
+            setattr(instance, field, value)
+    return bool(updated)
+
+def nights_taken(booking):
+    """Whether another confirmed booking overlaps ``booking``'s stay.
+
+    Locks the listing row first, so confirmations for one listing run one at
+    a time and each sees the bookings the previous one confirmed. Call it
+    inside a transaction.
+    """
+    list(Listing.objects.select_for_update().filter(pk=booking.listing_id).values_list('pk', flat=True))
+    return Booking.objects.filter(
+        listing_id=booking.listing_id,
+        status=Booking.CONFIRMED,
+        check_in__lt=booking.check_out,
+        check_out__gt=booking.check_in
+    ).exclude(pk=booking.pk).exists()
+
+def complete_payment(payment, payment_method=''):
+    """Mark a payment completed, confirm its booking and email the user once.
+
+    A payment that was expired to FAILED can still be completed when Chapa
+    reports it paid. If another booking was confirmed for the same nights
+    after this one's hold lapsed, the booking is cancelled and the payment
+    refunded instead. Load the payment with ``select_related('booking__user')``
+    to avoid extra queries.
+    """
+    with transaction.atomic():
+        won = transition(
+            payment,
+            [Payment.PENDING, Payment.FAILED],
+            Payment.COMPLETED,
+            payment_date=timezone.now(),
+            payment_method=payment_method
+        )
+        if not won:
+            return False
+        
+        booking = payment.booking
+        if booking.status == Booking.PENDING and nights_taken(booking):
+            transition(booking, [Booking.PENDING], Booking.CANCELLED)
+            transaction.on_commit(lambda: refund_payment.delay(
+                payment.id,
+                f'Nights of booking #{booking.reference} were booked by another guest'
+            ))
+            transaction.on_commit(lambda: publish_payment_status(payment))
+            return True
+        
+        record_payment_completed(payment, booking.listing_id)
+        if transition(booking, [Booking.PENDING], Booking.CONFIRMED):
+            record_booking_confirmed(booking)
+            # Queryset updates skip post_save, so invalidate explicitly
+            transaction.on_commit(lambda: invalidate_calendar(booking.listing_id))
+        transaction.on_commit(lambda: send_payment_confirmation_email.delay(
+            user_email=booking.user.email,
+            booking_id=booking.id,
+            transaction_id=payment.transaction_id
+        ))
+        transaction.on_commit(lambda: publish_payment_status(payment))
+    return True
+
+def complete_past_stays(batch_size=1000):
+    """Mark confirmed bookings whose stay has ended as completed, in batches.
+
+    Both statuses count as booked nights, so calendars and stats are
+    unchanged. Returns the number of bookings completed.
+    """
+    finished = Booking.objects.filter(status=Booking.CONFIRMED, check_out__lte=timezone.now().date())
+    completed = 0
+    while True:
+        ids = list(finished.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return completed
+        completed += Booking.objects.filter(id__in=ids, status=Booking.CONFIRMED).update(
+            status=Booking.COMPLETED,
+            updated_at=timezone.now()
+        )
+
+def fail_payment(payment):
+    """Mark a pending payment failed and free the booking's held nights.
+
+    Returns whether this call made the change.
+    """
+    if not transition(payment, [Payment.PENDING], Payment.FAILED):
+        return False
+    booking = payment.booking
+    transaction.on_commit(lambda: release_booking_holds(booking))
+    transaction.on_commit(lambda: publish_payment_status(payment))
+    return True
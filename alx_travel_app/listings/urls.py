@@ -1,18 +1,36 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     ListingViewSet, 
     BookingViewSet, 
     PaymentViewSet,
-    chapa_webhook
+    chapa_webhook,
+    initiate_payment_async,
+    verify_payment_async,
+    payment_status_stream,
+    analytics,
+    metrics
 )
 
 router = DefaultRouter()
 router.register(r'listings', ListingViewSet)
-router.register(r'bookings', BookingViewSet)
+router.register(r'bookings', BookingViewSet, basename='booking')
 router.register(r'payments', PaymentViewSet, basename='payment')
 
-urlpatterns = [
+urlpatterns = []
+
+# Under ASGI, serve the Chapa-bound endpoints from their async variants
+if settings.ASYNC_PAYMENT_VIEWS:
+    urlpatterns += [
+        path('payments/initiate/', initiate_payment_async, name='payment-initiate-payment'),
+        path('payments/verify/', verify_payment_async, name='payment-verify-payment'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
     path('payments/webhook/', chapa_webhook, name='chapa-webhook'),
+    path('payments/status/<str:transaction_id>/stream/', payment_status_stream, name='payment-status-stream'),
+    path('analytics/', analytics, name='analytics'),
+    path('metrics/', metrics, name='metrics'),
 ]
\ No newline at end of file
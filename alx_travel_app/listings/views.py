@@ -1,43 +1,142 @@
-import requests
-import json
+from datetime import date, timedelta
 from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import viewsets, status, generics
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.views import APIView
-from .models import Listing, Booking, Payment
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView, exception_handler
+from asgiref.sync import sync_to_async
+from .models import Listing, Booking, Payment, PaymentEvent, BookingArchive, PaymentArchive
 from .serializers import (
     ListingSerializer, 
     BookingSerializer, 
     PaymentSerializer,
     PaymentInitiationSerializer,
-    PaymentVerificationSerializer
+    PaymentVerificationSerializer,
+    QuoteRequestSerializer,
+    ArchivedBookingSerializer
 )
-from .tasks import send_booking_confirmation_email, send_payment_confirmation_email
+from .tasks import send_booking_confirmation_email
+from .availability import listing_calendar
+from .pricing import quote_listings
+from .analytics import OccupancyAnalytics
+from .dedup import enqueue_once
+from .transitions import complete_payment, fail_payment
+from .metrics import registry, render as render_metrics
+from .pubsub import status_message, status_stream, subscribe
+from .idempotency import IdempotencyClaim, idempotent
+from .throttling import BrowseThrottle, LoadSheddingThrottle, WebhookThrottle
+from . import chapa
 
 class ListingViewSet(viewsets.ModelViewSet):
     """ViewSet for listing operations"""
     queryset = Listing.objects.filter(is_available=True)
     serializer_class = ListingSerializer
     permission_classes = [AllowAny]
+    # Browse traffic is the first to go when the database is struggling
+    throttle_classes = [LoadSheddingThrottle, BrowseThrottle]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?ordering=popular sorts by precomputed confirmed bookings
+        if self.action == 'list' and self.request.query_params.get('ordering') == 'popular':
+            queryset = queryset.order_by(F('stats__confirmed_count').desc(nulls_last=True), 'id')
+        return queryset
+    
+    @action(detail=True, methods=['get'], url_path='calendar')
+    def calendar(self, request, pk=None):
+        """Booked nights as a base64 bitset (default) or run-length list (?encoding=rle)"""
+        listing = self.get_object()
+        try:
+            start = request.query_params.get('start')
+            start = date.fromisoformat(start) if start else timezone.now().date()
+            days = int(request.query_params.get('days', 365))
+        except ValueError:
+            return Response({'error': 'Invalid start or days'}, status=status.HTTP_400_BAD_REQUEST)
+        encoding = request.query_params.get('encoding', 'bitset')
+        if encoding not in ('bitset', 'rle') or not 1 <= days <= 366:
+            return Response({'error': 'encoding must be bitset or rle and days between 1 and 366'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(listing_calendar(listing.id, start, days, encoding), status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'], url_path='quote')
+    def quote(self, request):
+        """Price one stay for up to 500 listings at once"""
+        serializer = QuoteRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        check_in = serializer.validated_data['check_in']
+        check_out = serializer.validated_data['check_out']
+        quotes = quote_listings(serializer.validated_data['listing_ids'], check_in, check_out)
+        return Response({
+            'check_in': check_in,
+            'check_out': check_out,
+            'nights': (check_out - check_in).days,
+            'quotes': [
+                {'listing': listing_id, **{key: str(value) for key, value in quote.items()}}
+                for listing_id, quote in quotes.items()
+            ]
+        }, status=status.HTTP_200_OK)
 
 class BookingViewSet(viewsets.ModelViewSet):
-    """ViewSet for booking operations"""
+    """ViewSet for booking operations.
+
+    Finished bookings are moved to the archive tables after a while; detail
+    and reference lookups fall back to the archive, and ``?archived=true``
+    lists archived bookings.
+    """
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     
+    def _list_archived(self):
+        return self.action == 'list' and self.request.query_params.get('archived') == 'true'
+    
     def get_queryset(self):
+        if self._list_archived():
+            return BookingArchive.objects.filter(user=self.request.user).order_by('-check_in', '-id')
         return Booking.objects.filter(user=self.request.user)
     
+    def get_serializer_class(self):
+        if self._list_archived():
+            return ArchivedBookingSerializer
+        return super().get_serializer_class()
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Return the booking, from the archive if it has been archived"""
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            booking = get_object_or_404(BookingArchive.objects.filter(user=request.user), pk=kwargs['pk'])
+            return Response(ArchivedBookingSerializer(booking).data, status=status.HTTP_200_OK)
+    
+    @idempotent('booking-create')
+    def create(self, request, *args, **kwargs):
+        """Create a booking; retries with the same Idempotency-Key get the first response"""
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         """Save booking and trigger confirmation email"""
         booking = serializer.save(user=self.request.user)
         
-        # Trigger booking confirmation email asynchronously
-        send_booking_confirmation_email.delay(booking.id)
+        # Trigger booking confirmation email asynchronously; this also starts
+        # the resend cooldown for the booking
+        enqueue_once(
+            send_booking_confirmation_email,
+            f"booking-confirmation:{booking.id}",
+            settings.CONFIRMATION_RESEND_COOLDOWN,
+            booking.id
+        )
         
         # Return the booking instance
         return booking
@@ -47,162 +146,80 @@ class BookingViewSet(viewsets.ModelViewSet):
         """Resend booking confirmation email"""
         booking = self.get_object()
         
-        # Trigger booking confirmation email asynchronously
-        send_booking_confirmation_email.delay(booking.id)
+        # Collapse repeated clicks and client retries into one email per cooldown
+        sent, retry_after = enqueue_once(
+            send_booking_confirmation_email,
+            f"booking-confirmation:{booking.id}",
+            settings.CONFIRMATION_RESEND_COOLDOWN,
+            booking.id
+        )
+        if not sent:
+            return Response({
+                'error': 'Confirmation email was sent recently, please try again later',
+                'booking_reference': booking.reference,
+                'retry_after': retry_after
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(retry_after)})
         
         return Response({
             'message': 'Confirmation email has been sent',
             'booking_reference': booking.reference
         }, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], url_path='reference/(?P<reference>[^/]+)')
+    def by_reference(self, request, reference=None):
+        """Look up a booking by its reference, including archived bookings"""
+        booking = self.get_queryset().filter(reference=reference).first()
+        if booking is None:
+            booking = get_object_or_404(BookingArchive.objects.filter(user=request.user), reference=reference)
+            return Response(ArchivedBookingSerializer(booking).data, status=status.HTTP_200_OK)
+        serializer = self.get_serializer(booking)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 class PaymentViewSet(viewsets.ViewSet):
     """ViewSet for payment operations"""
     permission_classes = [IsAuthenticated]
     
     @action(detail=False, methods=['post'], url_path='initiate')
+    @idempotent('payment-initiate')
     def initiate_payment(self, request):
         """Initiate payment with Chapa API"""
-        serializer = PaymentInitiationSerializer(data=request.data)
-        if serializer.is_valid():
-            booking_id = serializer.validated_data['booking_id']
-            booking = get_object_or_404(Booking, id=booking_id, user=request.user)
-            
-            # Check if payment already exists
-            if hasattr(booking, 'payment'):
-                return Response({
-                    'error': 'Payment already initiated for this booking',
-                    'payment_url': booking.payment.raw_response.get('data', {}).get('checkout_url') if booking.payment.raw_response else None
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Prepare Chapa API request
-            chapa_url = f"{settings.CHAPA_BASE_URL}/transaction/initialize"
-            headers = {
-                'Authorization': f'Bearer {settings.CHAPA_SECRET_KEY}',
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'amount': str(booking.total_price),
-                'currency': 'ETB',
-                'email': request.user.email,
-                'first_name': request.user.first_name or 'Customer',
-                'last_name': request.user.last_name or 'User',
-                'phone_number': '0912345678',  # In production, get from user profile
-                'tx_ref': f"booking-{booking.id}-{timezone.now().timestamp()}",
-                'callback_url': settings.CHAPA_WEBHOOK_URL,
-                'return_url': f"http://localhost:3000/bookings/{booking.id}/payment/callback",
-                'customization': {
-                    'title': 'ALX Travel Booking',
-                    'description': f'Payment for booking #{booking.reference}'
-                }
-            }
-            
-            try:
-                # Make request to Chapa API
-                response = requests.post(chapa_url, headers=headers, data=json.dumps(payload))
-                response_data = response.json()
-                
-                if response.status_code == 200 and response_data.get('status') == 'success':
-                    # Create payment record
-                    payment = Payment.objects.create(
-                        booking=booking,
-                        amount=booking.total_price,
-                        chapa_transaction_id=response_data.get('data', {}).get('reference'),
-                        raw_response=response_data
-                    )
-                    
-                    # Return payment URL to redirect user
-                    return Response({
-                        'message': 'Payment initiated successfully',
-                        'payment_url': response_data.get('data', {}).get('checkout_url'),
-                        'transaction_id': payment.transaction_id,
-                        'booking_reference': booking.reference
-                    }, status=status.HTTP_200_OK)
-                else:
-                    return Response({
-                        'error': 'Failed to initiate payment',
-                        'details': response_data.get('message', 'Unknown error')
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                    
-            except requests.exceptions.RequestException as e:
-                return Response({
-                    'error': 'Payment gateway connection failed',
-                    'details': str(e)
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-                
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        prepared, error = _prepare_initiation(request)
+        if error:
+            return Response(*error)
+        booking, payload = prepared
+        
+        try:
+            status_code, response_data = chapa.initialize(payload)
+        except chapa.ChapaError as e:
+            return Response({
+                'error': 'Payment gateway connection failed',
+                'details': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(*_record_initiation(booking, payload, status_code, response_data))
     
     @action(detail=False, methods=['post'], url_path='verify')
     def verify_payment(self, request):
         """Verify payment status with Chapa API"""
-        serializer = PaymentVerificationSerializer(data=request.data)
-        if serializer.is_valid():
-            transaction_id = serializer.validated_data['transaction_id']
-            payment = get_object_or_404(Payment, transaction_id=transaction_id, booking__user=request.user)
-            
-            # Verify with Chapa API
-            chapa_url = f"{settings.CHAPA_BASE_URL}/transaction/verify/{payment.chapa_transaction_id}"
-            headers = {
-                'Authorization': f'Bearer {settings.CHAPA_SECRET_KEY}'
-            }
-            
-            try:
-                response = requests.get(chapa_url, headers=headers)
-                response_data = response.json()
-                
-                if response.status_code == 200 and response_data.get('status') == 'success':
-                    transaction_data = response_data.get('data', {})
-                    
-                    # Update payment status
-                    payment.status = Payment.COMPLETED
-                    payment.payment_date = timezone.now()
-                    payment.payment_method = transaction_data.get('payment_method', '')
-                    payment.raw_response = response_data
-                    payment.save()
-                    
-                    # Update booking status
-                    booking = payment.booking
-                    booking.status = Booking.CONFIRMED
-                    booking.save()
-                    
-                    # Send confirmation email asynchronously
-                    send_payment_confirmation_email.delay(
-                        user_email=request.user.email,
-                        booking_id=booking.id,
-                        transaction_id=payment.transaction_id
-                    )
-                    
-                    return Response({
-                        'message': 'Payment verified successfully',
-                        'status': payment.status,
-                        'transaction_id': payment.transaction_id,
-                        'booking_status': booking.status,
-                        'verified_at': payment.payment_date
-                    }, status=status.HTTP_200_OK)
-                else:
-                    # Payment failed or pending
-                    payment.status = Payment.FAILED
-                    payment.raw_response = response_data
-                    payment.save()
-                    
-                    return Response({
-                        'error': 'Payment verification failed',
-                        'status': payment.status,
-                        'details': response_data.get('message', 'Unknown error')
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                    
-            except requests.exceptions.RequestException as e:
-                return Response({
-                    'error': 'Payment verification service unavailable',
-                    'details': str(e)
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-                
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        payment, error = _prepare_verification(request)
+        if error:
+            return Response(*error)
+        
+        try:
+            status_code, response_data = chapa.verify(payment.tx_ref or payment.chapa_transaction_id)
+        except chapa.ChapaError as e:
+            return Response({
+                'error': 'Payment verification service unavailable',
+                'details': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(*_record_verification(payment, status_code, response_data))
     
     @action(detail=False, methods=['get'], url_path='status/(?P<transaction_id>[^/.]+)')
     def payment_status(self, request, transaction_id=None):
-        """Check payment status"""
-        payment = get_object_or_404(Payment, transaction_id=transaction_id, booking__user=request.user)
+        """Check payment status, including payments of archived bookings"""
+        lookup = {'transaction_id': transaction_id, 'booking__user': request.user}
+        payment = Payment.objects.select_related('booking').filter(**lookup).first()
+        if payment is None:
+            payment = get_object_or_404(PaymentArchive.objects.select_related('booking'), **lookup)
         
         return Response({
             'transaction_id': payment.transaction_id,
@@ -213,8 +230,277 @@ class PaymentViewSet(viewsets.ViewSet):
             'updated_at': payment.updated_at
         }, status=status.HTTP_200_OK)
 
+def _prepare_initiation(request):
+    """Validate a payment initiation request and build the Chapa payload.
+
+    Returns ``((booking, payload), None)``, or ``(None, (body, status))`` when
+    the request is rejected.
+    """
+    serializer = PaymentInitiationSerializer(data=request.data)
+    if not serializer.is_valid():
+        return None, (serializer.errors, status.HTTP_400_BAD_REQUEST)
+    
+    booking = Booking.objects.filter(id=serializer.validated_data['booking_id'], user=request.user).first()
+    if booking is None:
+        return None, ({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+    
+    # Check if payment already exists
+    if hasattr(booking, 'payment'):
+        return None, ({
+            'error': 'Payment already initiated for this booking',
+            'payment_url': booking.payment.checkout_url or None
+        }, status.HTTP_400_BAD_REQUEST)
+    
+    payload = {
+        'amount': str(booking.total_price),
+        'currency': 'ETB',
+        'email': request.user.email,
+        'first_name': request.user.first_name or 'Customer',
+        'last_name': request.user.last_name or 'User',
+        'phone_number': '0912345678',  # In production, get from user profile
+        'tx_ref': f"booking-{booking.id}-{timezone.now().timestamp()}",
+        'callback_url': settings.CHAPA_WEBHOOK_URL,
+        'return_url': f"http://localhost:3000/bookings/{booking.id}/payment/callback",
+        'customization': {
+            'title': 'ALX Travel Booking',
+            'description': f'Payment for booking #{booking.reference}'
+        }
+    }
+    return (booking, payload), None
+
+def _record_initiation(booking, payload, status_code, response_data):
+    """Store the payment after Chapa's initialize response; returns ``(body, status)``"""
+    if status_code != 200 or response_data.get('status') != 'success':
+        return {
+            'error': 'Failed to initiate payment',
+            'details': response_data.get('message', 'Unknown error')
+        }, status.HTTP_400_BAD_REQUEST
+    
+    # Create payment record; the full response goes to the event log
+    payment = Payment.objects.create(
+        booking=booking,
+        amount=booking.total_price,
+        tx_ref=payload['tx_ref'],
+        chapa_transaction_id=response_data.get('data', {}).get('reference'),
+        checkout_url=response_data.get('data', {}).get('checkout_url') or ''
+    )
+    PaymentEvent.record(payment, PaymentEvent.INITIALIZE, response_data)
+    
+    # Return payment URL to redirect user
+    return {
+        'message': 'Payment initiated successfully',
+        'payment_url': response_data.get('data', {}).get('checkout_url'),
+        'transaction_id': payment.transaction_id,
+        'booking_reference': booking.reference
+    }, status.HTTP_200_OK
+
+def _prepare_verification(request):
+    """Load the caller's payment for a verification request.
+
+    Returns ``(payment, None)``, or ``(None, (body, status))`` when the request
+    is rejected.
+    """
+    serializer = PaymentVerificationSerializer(data=request.data)
+    if not serializer.is_valid():
+        return None, (serializer.errors, status.HTTP_400_BAD_REQUEST)
+    
+    payment = Payment.objects.select_related('booking__user').filter(
+        transaction_id=serializer.validated_data['transaction_id'],
+        booking__user=request.user
+    ).first()
+    if payment is None:
+        return None, ({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+    return payment, None
+
+def _record_verification(payment, status_code, response_data):
+    """Apply Chapa's verify response to the payment; returns ``(body, status)``"""
+    if chapa.is_paid(status_code, response_data):
+        transaction_data = response_data.get('data', {})
+        
+        # Complete the payment and confirm the booking; if the webhook got
+        # there first, report the state it left
+        if not complete_payment(payment, transaction_data.get('payment_method', '')):
+            payment.refresh_from_db(fields=['status', 'payment_date'])
+            payment.booking.refresh_from_db(fields=['status'])
+        PaymentEvent.record(payment, PaymentEvent.VERIFY, response_data)
+        
+        return {
+            'message': 'Payment verified successfully',
+            'status': payment.status,
+            'transaction_id': payment.transaction_id,
+            'booking_status': payment.booking.status,
+            'verified_at': payment.payment_date
+        }, status.HTTP_200_OK
+    
+    # Payment failed or pending
+    if not fail_payment(payment):
+        payment.refresh_from_db(fields=['status'])
+    PaymentEvent.record(payment, PaymentEvent.VERIFY, response_data)
+    
+    return {
+        'error': 'Payment verification failed',
+        'status': payment.status,
+        'details': response_data.get('message', 'Unknown error')
+    }, status.HTTP_400_BAD_REQUEST
+
+def _authenticate(request):
+    """Wrap a plain Django request for the API's authentication and parsers.
+
+    Returns ``(drf_request, None)``, or ``(None, (body, status))`` when the
+    caller is not authenticated.
+    """
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        authenticated = drf_request.user.is_authenticated
+    except APIException as e:
+        return None, ({'detail': e.detail}, e.status_code)
+    if not authenticated:
+        return None, ({'detail': 'Authentication credentials were not provided.'}, status.HTTP_401_UNAUTHORIZED)
+    return drf_request, None
+
+def _check_access(drf_request, view_action):
+    """Run PaymentViewSet's permission and throttle checks for ``view_action``.
+
+    The async views are plain Django views, so DRF never runs these for
+    them. Returns None, or ``(body, status, headers)`` when the request is
+    refused.
+    """
+    view = PaymentViewSet(action=view_action, request=drf_request, args=(), kwargs={}, format_kwarg=None)
+    try:
+        view.check_permissions(drf_request)
+        view.check_throttles(drf_request)
+    except APIException as e:
+        response = exception_handler(e, {'view': view, 'args': (), 'kwargs': {}, 'request': drf_request})
+        headers = {'Retry-After': response['Retry-After']} if response.has_header('Retry-After') else None
+        return response.data, response.status_code, headers
+    return None
+
+def _api_json(body, status_code, headers=None):
+    return JsonResponse(body, status=status_code, headers=headers, encoder=JSONEncoder, safe=False)
+
+def _payment_snapshot(request, transaction_id):
+    """Authenticate like the API and load the caller's payment status.
+
+    Returns ``(body, status)``, with refusal headers as a third item when
+    throttled; 200 bodies are the first stream event.
+    """
+    drf_request, error = _authenticate(request)
+    if error:
+        return error
+    error = _check_access(drf_request, 'payment_status')
+    if error:
+        return error
+    payment = Payment.objects.filter(
+        transaction_id=transaction_id,
+        booking__user=drf_request.user
+    ).values_list('transaction_id', 'status', 'updated_at').first()
+    if payment is None:
+        return {'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND
+    return status_message(*payment), status.HTTP_200_OK
+
+async def payment_status_stream(request, transaction_id):
+    """Stream a payment's status as server-sent events (serve through ASGI)"""
+    # Subscribe before reading so a transition in between is not missed
+    pubsub = await subscribe(transaction_id)
+    snapshot = await sync_to_async(_payment_snapshot)(request, transaction_id)
+    if snapshot[1] != status.HTTP_200_OK:
+        await pubsub.reset()
+        return _api_json(*snapshot)
+    body = snapshot[0]
+    
+    response = StreamingHttpResponse(status_stream(pubsub, body), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Async variants of the Chapa-bound payment endpoints. Under ASGI the gateway
+# call awaits on the event loop instead of holding a worker thread; only the
+# short database steps run in a thread. Routed in place of the viewset
+# actions when ASYNC_PAYMENT_VIEWS is enabled, and apply the viewset's
+# permissions and throttles through _check_access. DRF's session authentication
+# enforces CSRF itself, as it does for the viewset, so both are marked exempt
+# (directly, since Django 4.2's csrf_exempt does not wrap coroutines).
+
+async def initiate_payment_async(request):
+    """Async variant of PaymentViewSet.initiate_payment"""
+    if request.method != 'POST':
+        return _api_json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    def prepare():
+        drf_request, error = _authenticate(request)
+        if error:
+            return None, None, error
+        error = _check_access(drf_request, 'initiate_payment')
+        if error:
+            return None, None, error
+        claim, answer = IdempotencyClaim.acquire(drf_request, 'payment-initiate')
+        if answer:
+            return None, None, answer
+        prepared, error = _prepare_initiation(drf_request)
+        if error and claim:
+            claim.complete(error[1], error[0])
+        return claim, prepared, error
+    
+    def finish(claim, body, status_code):
+        if claim:
+            claim.complete(status_code, body)
+        return body, status_code
+    
+    claim, prepared, error = await sync_to_async(prepare)()
+    if error:
+        return _api_json(*error)
+    booking, payload = prepared
+    
+    try:
+        try:
+            status_code, response_data = await chapa.ainitialize(payload)
+        except chapa.ChapaError as e:
+            result = ({
+                'error': 'Payment gateway connection failed',
+                'details': str(e)
+            }, status.HTTP_503_SERVICE_UNAVAILABLE)
+        else:
+            result = await sync_to_async(_record_initiation)(booking, payload, status_code, response_data)
+    except BaseException:
+        if claim:
+            await sync_to_async(claim.release)()
+        raise
+    return _api_json(*await sync_to_async(finish)(claim, *result))
+
+async def verify_payment_async(request):
+    """Async variant of PaymentViewSet.verify_payment"""
+    if request.method != 'POST':
+        return _api_json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    def prepare():
+        drf_request, error = _authenticate(request)
+        if error:
+            return None, error
+        error = _check_access(drf_request, 'verify_payment')
+        return (None, error) if error else _prepare_verification(drf_request)
+    payment, error = await sync_to_async(prepare)()
+    if error:
+        return _api_json(*error)
+    
+    try:
+        status_code, response_data = await chapa.averify(payment.tx_ref or payment.chapa_transaction_id)
+    except chapa.ChapaError as e:
+        return _api_json({
+            'error': 'Payment verification service unavailable',
+            'details': str(e)
+        }, status.HTTP_503_SERVICE_UNAVAILABLE)
+    return _api_json(*await sync_to_async(_record_verification)(payment, status_code, response_data))
+
+initiate_payment_async.csrf_exempt = True
+verify_payment_async.csrf_exempt = True
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([WebhookThrottle])
 def chapa_webhook(request):
     """Handle Chapa payment webhook"""
     # Verify webhook signature (in production, verify with Chapa's signature)
@@ -222,41 +508,63 @@ def chapa_webhook(request):
     
     # Extract transaction reference
     tx_ref = data.get('tx_ref')
-    status = data.get('status')
+    payment_status = data.get('status')
     
     if not tx_ref:
         return Response({'error': 'Missing transaction reference'}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        # Find payment by Chapa transaction ID
-        payment = Payment.objects.get(chapa_transaction_id=tx_ref)
+        # Find payment by the tx_ref we generated (single unique index probe)
+        payment = Payment.objects.select_related('booking__user').get(tx_ref=tx_ref)
         
-        if status == 'success':
-            payment.status = Payment.COMPLETED
-            payment.payment_date = timezone.now()
-            payment.raw_response = data
-            
-            # Update booking status
-            booking = payment.booking
-            booking.status = Booking.CONFIRMED
-            booking.save()
-            
-            # Send confirmation email
-            send_payment_confirmation_email.delay(
-                user_email=booking.user.email,
-                booking_id=booking.id,
-                transaction_id=payment.transaction_id
-            )
-            
-        elif status == 'failed':
-            payment.status = Payment.FAILED
-            payment.raw_response = data
+        # Conditional transitions make duplicate or racing webhooks harmless
+        if payment_status == 'success':
+            complete_payment(payment, data.get('payment_method', ''))
+        elif payment_status == 'failed':
+            fail_payment(payment)
         
-        payment.save()
+        PaymentEvent.record(payment, PaymentEvent.WEBHOOK, data)
         
         return Response({'message': 'Webhook processed successfully'}, status=status.HTTP_200_OK)
         
     except Payment.DoesNotExist:
         return Response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def analytics(request):
+    """Occupancy, lead time, ADR and demand forecast per location (staff only)"""
+    try:
+        end = request.query_params.get('end')
+        end = date.fromisoformat(end) if end else timezone.now().date()
+        start = request.query_params.get('start')
+        start = date.fromisoformat(start) if start else end - timedelta(days=365)
+        horizon = int(request.query_params.get('horizon', 28))
+    except ValueError:
+        return Response({'error': 'Invalid start, end or horizon'}, status=status.HTTP_400_BAD_REQUEST)
+    if not start < end or (end - start).days > 3 * 366 or not 1 <= horizon <= 366:
+        return Response({'error': 'Window must be 1 day to 3 years and horizon 1 to 366 days'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    # The scan is expensive, so identical windows are served from cache
+    key = f"analytics:{start.isoformat()}:{end.isoformat()}:{horizon}"
+    summary = cache.get(key)
+    if summary is None:
+        summary = OccupancyAnalytics(start, end).load().summary(horizon)
+        cache.set(key, summary, settings.ANALYTICS_CACHE_TTL)
+    return Response(summary, status=status.HTTP_200_OK)
+
+def metrics(request):
+    """Expose collected metrics in the Prometheus text format.
+
+    Scrapers authenticate with the METRICS_TOKEN bearer token; without a
+    configured token only staff users can read the endpoint.
+    """
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and request.headers.get('Authorization') == f'Bearer {token}'
+    if not (authorized or request.user.is_staff):
+        return HttpResponse(status=403)
+    
+    # Include this process's buffered observations
+    registry.flush()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
\ No newline at end of file